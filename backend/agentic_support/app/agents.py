@@ -1,10 +1,13 @@
 from __future__ import annotations
 
 import asyncio
+from contextlib import AsyncExitStack
 from dataclasses import dataclass, field
 from datetime import datetime
-from typing import Any, Dict, List, Optional
+from typing import Any, Optional
 
+from . import workflows  # noqa: F401 - registers the built-in workflow types
+from .decision_tables import DecisionTables, decision_tables
 from .models import (
     AccountEntitlement,
     CustomerInteraction,
@@ -14,10 +17,11 @@ from .models import (
     WorkflowStatus,
     WorkflowType,
     ActionResult,
-    VerificationResult,
     EscalationInfo,
     WorkflowState,
 )
+from .registry import WorkflowDefinition, WorkflowRegistry, workflow_registry
+from .telemetry_history import DeviceHistory
 
 
 @dataclass
@@ -34,14 +38,33 @@ class WorkflowContext:
     cc_platform: Optional[Any] = None  # e.g. Genesys / Twilio client
     telemetry_client: Optional[Any] = None
     crm_client: Optional[Any] = None
+    # Packed telemetry history for the device, if it has reported before
+    history: Optional[DeviceHistory] = None
+    # Epoch seconds that history windows end at (the history's clock at trigger time)
+    as_of: Optional[float] = None
+    # Event-loop time by which the whole run must finish (None = no deadline)
+    deadline: Optional[float] = None
+    # Per-run resources (subscriptions, pooled connections, ...) are registered
+    # here by agents and released when the run ends, however it ends.
+    resources: AsyncExitStack = field(default_factory=AsyncExitStack)
 
 
 class BaseAgent:
     name: str
+    registry: WorkflowRegistry = workflow_registry
 
     async def run(self, ctx: WorkflowContext, state: WorkflowState) -> WorkflowState:
         raise NotImplementedError
 
+    def _definition(self, ctx: WorkflowContext, state: WorkflowState) -> Optional[WorkflowDefinition]:
+        """Look up the registered workflow; marks the run failed if the type is unsupported."""
+        definition = self.registry.get(ctx.workflow_type)
+        if definition is None:
+            self._log(state, "error", "Unsupported workflow type", workflow_type=ctx.workflow_type.value)
+            state.status = WorkflowStatus.failed
+            state.stage = WorkflowStage.failed
+        return definition
+
     def _log(self, state: WorkflowState, level: str, message: str, **data: Any) -> None:
         state.logs.append(
             {
@@ -66,13 +89,8 @@ class IntentDetectionAgent(BaseAgent):
         text = ctx.interaction.text.lower()
         self._log(state, "info", "Running intent detection", text=text)
 
-        if "offline" in text or "not responding" in text or "cannot print" in text:
-            inferred = WorkflowType.printer_offline
-        elif "ink" in text or "cartridge" in text:
-            inferred = WorkflowType.ink_error
-        else:
-            # default to offline; in production we might ask clarifying questions
-            inferred = WorkflowType.printer_offline
+        # default to offline; in production we might ask clarifying questions
+        inferred = self.registry.match_intent(text) or WorkflowType.printer_offline
 
         state.diagnosis = (state.diagnosis or {}) | {"intent": inferred.value}
         self._log(state, "info", "Intent detected", workflow_type=inferred.value)
@@ -86,72 +104,32 @@ class DiagnosticAgent(BaseAgent):
 
     name = "diagnostic"
 
+    def __init__(self, tables: Optional[DecisionTables] = None) -> None:
+        self.tables = tables or decision_tables
+
     async def run(self, ctx: WorkflowContext, state: WorkflowState) -> WorkflowState:
         self._log(state, "info", "Starting diagnostic phase")
         state.stage = WorkflowStage.diagnosing
         state.status = WorkflowStatus.running
 
-        if ctx.workflow_type == WorkflowType.printer_offline:
-            await self._diagnose_printer_offline(ctx, state)
-        elif ctx.workflow_type == WorkflowType.ink_error:
-            await self._diagnose_ink_error(ctx, state)
-        else:
-            self._log(state, "error", "Unsupported workflow type", workflow_type=ctx.workflow_type.value)
-            state.status = WorkflowStatus.failed
-            state.stage = WorkflowStage.failed
-
+        definition = self._definition(ctx, state)
+        if definition is None:
+            return state
+
+        key = ctx.workflow_type.value
+        diag = await definition.diagnose(ctx, state)
+        if ctx.history is not None:
+            diag["trend_24h"] = ctx.history.trend(24 * 3600, now=ctx.as_of)
+        if "root_cause" not in diag and self.tables.supports(ctx.workflow_type):
+            # Root cause comes from the precomputed decision table for this fingerprint
+            diag["root_cause"] = self.tables.decide(
+                ctx.workflow_type, ctx.telemetry, ctx.history, now=ctx.as_of
+            ).root_cause
+
+        state.diagnosis = (state.diagnosis or {}) | {key: diag}
+        self._log(state, "info", f"Diagnostics completed for {key}", diagnosis=diag)
         return state
 
-    async def _diagnose_printer_offline(self, ctx: WorkflowContext, state: WorkflowState) -> None:
-        diag = {}
-        t = ctx.telemetry
-        diag["heartbeat_seen"] = bool(t.last_heartbeat_ts)
-        diag["online"] = t.online
-        diag["network_reachable"] = t.network_reachable
-        diag["spooler_healthy"] = t.spooler_healthy
-        diag["error_codes"] = t.error_codes
-
-        # Simple root cause heuristic
-        if not t.online:
-            if not t.network_reachable:
-                root = "network_connectivity_issue"
-            elif not t.spooler_healthy:
-                root = "spooler_failure"
-            else:
-                root = "unknown_offline_state"
-        else:
-            root = "intermittent_issue_or_resolved"
-
-        diag["root_cause"] = root
-        state.diagnosis = (state.diagnosis or {}) | {"printer_offline": diag}
-        self._log(state, "info", "Diagnostics completed for printer_offline", diagnosis=diag)
-
-    async def _diagnose_ink_error(self, ctx: WorkflowContext, state: WorkflowState) -> None:
-        t = ctx.telemetry
-        diag: Dict[str, Any] = {
-            "error_codes": t.error_codes,
-            "ink_levels": {
-                "cyan": t.ink_level_cyan,
-                "magenta": t.ink_level_magenta,
-                "yellow": t.ink_level_yellow,
-                "black": t.ink_level_black,
-            },
-        }
-
-        # Mock rules for root cause
-        if any(code.startswith("INK_AUTH") for code in t.error_codes):
-            root = "cartridge_not_authentic"
-        elif any(code.startswith("INK_FW") for code in t.error_codes):
-            root = "firmware_incompatibility"
-        elif any(level is not None and level == 0 for level in diag["ink_levels"].values()):
-            root = "empty_cartridge"
-        else:
-            root = "undetermined_ink_issue"
-
-        diag["root_cause"] = root
-        state.diagnosis = (state.diagnosis or {}) | {"ink_error": diag}
-        self._log(state, "info", "Diagnostics completed for ink_error", diagnosis=diag)
-
 
 class ActionExecutionAgent(BaseAgent):
     """
@@ -161,14 +139,26 @@ class ActionExecutionAgent(BaseAgent):
 
     name = "action_execution"
 
+    def __init__(self, tables: Optional[DecisionTables] = None) -> None:
+        self.tables = tables or decision_tables
+
     async def run(self, ctx: WorkflowContext, state: WorkflowState) -> WorkflowState:
         self._log(state, "info", "Starting action phase")
         state.stage = WorkflowStage.acting
 
-        if ctx.workflow_type == WorkflowType.printer_offline:
-            await self._actions_printer_offline(ctx, state)
-        elif ctx.workflow_type == WorkflowType.ink_error:
-            await self._actions_ink_error(ctx, state)
+        definition = self._definition(ctx, state)
+        if definition is None:
+            return state
+        if definition.act is not None:
+            await definition.act(ctx, state)
+            return state
+
+        diag = (state.diagnosis or {}).get(ctx.workflow_type.value, {})
+        action = self.tables.action_for(ctx.workflow_type, diag.get("root_cause"))
+        if action is not None:
+            # In a real system, this would be an API call to device mgmt / RPA
+            await asyncio.sleep(0.1)
+            await self._record_action(state, action.name, action.success, action.details)
 
         return state
 
@@ -184,66 +174,6 @@ class ActionExecutionAgent(BaseAgent):
         state.actions.append(result)
         self._log(state, "info" if success else "error", f"Action executed: {name}", success=success, details=details)
 
-    async def _actions_printer_offline(self, ctx: WorkflowContext, state: WorkflowState) -> None:
-        diag = (state.diagnosis or {}).get("printer_offline", {})
-        root = diag.get("root_cause")
-
-        # In a real system, these would be API calls to device mgmt / RPA
-        if root == "spooler_failure":
-            await asyncio.sleep(0.1)
-            await self._record_action(state, "restart_spooler", True, "Spooler restart command issued.")
-        elif root == "network_connectivity_issue":
-            await asyncio.sleep(0.1)
-            await self._record_action(state, "rebind_printer_ip", True, "Rebound printer to correct IP.")
-        elif root == "unknown_offline_state":
-            await asyncio.sleep(0.1)
-            await self._record_action(state, "reset_print_queue", True, "Cleared and reset print queue.")
-        else:
-            await asyncio.sleep(0.1)
-            await self._record_action(
-                state,
-                "noop",
-                True,
-                "No obvious issue detected; recorded observation for monitoring.",
-            )
-
-    async def _actions_ink_error(self, ctx: WorkflowContext, state: WorkflowState) -> None:
-        diag = (state.diagnosis or {}).get("ink_error", {})
-        root = diag.get("root_cause")
-
-        if root == "cartridge_not_authentic":
-            await asyncio.sleep(0.1)
-            await self._record_action(
-                state,
-                "sync_subscription",
-                True,
-                "Synced subscription and revalidated cartridge entitlement.",
-            )
-        elif root == "firmware_incompatibility":
-            await asyncio.sleep(0.1)
-            await self._record_action(
-                state,
-                "refresh_firmware",
-                True,
-                "Queued firmware refresh for printer and cartridges.",
-            )
-        elif root == "empty_cartridge" and state.diagnosis:
-            await asyncio.sleep(0.1)
-            await self._record_action(
-                state,
-                "create_replacement_shipment",
-                True,
-                "Auto-created replacement cartridge shipment for customer.",
-            )
-        else:
-            await asyncio.sleep(0.1)
-            await self._record_action(
-                state,
-                "reset_cartridge_state",
-                True,
-                "Reset cartridge state and requested device to re-enumerate cartridges.",
-            )
-
 
 class VerificationAgent(BaseAgent):
     """
@@ -256,45 +186,15 @@ class VerificationAgent(BaseAgent):
         self._log(state, "info", "Starting verification phase")
         state.stage = WorkflowStage.verifying
 
-        if ctx.workflow_type == WorkflowType.printer_offline:
-            result = await self._verify_printer_offline(ctx, state)
-        else:
-            result = await self._verify_ink_error(ctx, state)
+        definition = self._definition(ctx, state)
+        if definition is None:
+            return state
 
+        result = await definition.verify(ctx, state)
         state.verification = result
         self._log(state, "info", "Verification completed", success=result.success, checks=result.checks)
         return state
 
-    async def _verify_printer_offline(self, ctx: WorkflowContext, state: WorkflowState) -> VerificationResult:
-        # In reality we'd re-pull telemetry from a device platform
-        t = ctx.telemetry
-        checks = {
-            "device_online": bool(t.online),
-            "heartbeat_recent": t.last_heartbeat_ts is not None,
-            "spooler_healthy": bool(t.spooler_healthy),
-        }
-        success = all(checks.values())
-        details = "All checks passed" if success else "One or more verification checks failed"
-        return VerificationResult(success=success, checks=checks, details=details)
-
-    async def _verify_ink_error(self, ctx: WorkflowContext, state: WorkflowState) -> VerificationResult:
-        t = ctx.telemetry
-        checks = {
-            "no_error_codes": not t.error_codes,
-            "ink_levels_non_zero": all(
-                level is None or level > 0
-                for level in [
-                    t.ink_level_cyan,
-                    t.ink_level_magenta,
-                    t.ink_level_yellow,
-                    t.ink_level_black,
-                ]
-            ),
-        }
-        success = all(checks.values())
-        details = "Ink system healthy" if success else "Ink error persists or levels invalid"
-        return VerificationResult(success=success, checks=checks, details=details)
-
 
 class EscalationDecisionAgent(BaseAgent):
     """
@@ -307,28 +207,19 @@ class EscalationDecisionAgent(BaseAgent):
         self._log(state, "info", "Evaluating escalation rules")
         state.stage = WorkflowStage.closing
 
-        attempts = state.attempts
-        verification = state.verification
-
-        escalate = False
-        reason = None
-        target_queue = None
+        definition = self._definition(ctx, state)
+        if definition is None:
+            return state
 
+        verification = state.verification
+        escalation = None
         if verification and not verification.success:
-            if ctx.workflow_type == WorkflowType.printer_offline:
-                if attempts >= 2:
-                    escalate = True
-                    reason = "Automated recovery attempts failed for printer_offline."
-                    target_queue = "L2-Networking"
-            elif ctx.workflow_type == WorkflowType.ink_error:
-                diag = (state.diagnosis or {}).get("ink_error", {})
-                root = diag.get("root_cause")
-                if root in {"physical_damage", "undetermined_ink_issue"} or attempts >= 2:
-                    escalate = True
-                    reason = "Ink error unresolved; possible physical damage or repeated failure."
-                    target_queue = "L2-Hardware"
-
-        state.escalation = EscalationInfo(required=escalate, reason=reason, target_queue=target_queue)
+            escalation = definition.escalate(ctx, state)
+
+        state.escalation = escalation or EscalationInfo(required=False)
+        escalate = state.escalation.required
+        reason = state.escalation.reason
+        target_queue = state.escalation.target_queue
 
         if escalate:
             state.status = WorkflowStatus.escalated
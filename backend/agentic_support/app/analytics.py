@@ -0,0 +1,248 @@
+from __future__ import annotations
+
+import math
+from collections import Counter, deque
+from dataclasses import dataclass, field
+from datetime import datetime, timezone
+from typing import Any, Deque, Dict, List, Optional, Tuple
+
+from .models import WorkflowState, WorkflowStatus
+
+
+class QuantileSketch:
+    """
+    Streaming quantile sketch with relative-error guarantees.
+
+    Values are mapped into logarithmically spaced buckets (DDSketch style), so
+    inserts are O(1) amortized, memory is bounded by ``max_buckets`` and
+    quantile queries only walk the buckets, never the raw samples. When the
+    bucket limit is hit, the lowest buckets are collapsed in chunks into a
+    floor bucket that absorbs every smaller value from then on.
+    """
+
+    def __init__(self, relative_accuracy: float = 0.02, max_buckets: int = 512) -> None:
+        self._gamma = (1 + relative_accuracy) / (1 - relative_accuracy)
+        self._log_gamma = math.log(self._gamma)
+        self._max_buckets = max_buckets
+        self._buckets: Dict[int, int] = {}
+        self._floor_key: Optional[int] = None
+        self._zero_count = 0
+        self.count = 0
+        self.total = 0.0
+        self.min: Optional[float] = None
+        self.max: Optional[float] = None
+
+    def add(self, value: float) -> None:
+        value = max(value, 0.0)
+        self.count += 1
+        self.total += value
+        self.min = value if self.min is None else min(self.min, value)
+        self.max = value if self.max is None else max(self.max, value)
+
+        if value < 1e-9:
+            self._zero_count += 1
+            return
+
+        key = math.ceil(math.log(value) / self._log_gamma)
+        if self._floor_key is not None and key < self._floor_key:
+            key = self._floor_key
+        self._buckets[key] = self._buckets.get(key, 0) + 1
+        if len(self._buckets) > self._max_buckets:
+            self._collapse_lowest()
+
+    def _collapse_lowest(self) -> None:
+        # Fold the lowest eighth of the buckets into the next one up; precision
+        # is sacrificed on the fast end of the distribution, which matters least
+        # for SLA reporting. Collapsing in chunks means the sort runs once per
+        # max_buckets / 8 new buckets rather than on every insert.
+        keys = sorted(self._buckets)
+        chunk = max(1, self._max_buckets // 8)
+        self._floor_key = keys[chunk]
+        for key in keys[:chunk]:
+            self._buckets[self._floor_key] += self._buckets.pop(key)
+
+    def quantile(self, q: float) -> Optional[float]:
+        if self.count == 0:
+            return None
+
+        rank = q * (self.count - 1)
+        seen = self._zero_count
+        if rank < seen:
+            return 0.0
+        for key in sorted(self._buckets):
+            seen += self._buckets[key]
+            if seen > rank:
+                # Midpoint of the bucket in log space, clamped to observed range
+                estimate = 2 * self._gamma ** key / (1 + self._gamma)
+                return min(max(estimate, self.min), self.max)
+        return self.max
+
+    def summary(self) -> Dict[str, Optional[float]]:
+        return {
+            "count": self.count,
+            "mean": self.total / self.count if self.count else None,
+            "min": self.min,
+            "max": self.max,
+            "p50": self.quantile(0.50),
+            "p90": self.quantile(0.90),
+            "p99": self.quantile(0.99),
+        }
+
+
+@dataclass
+class _OutcomeAggregate:
+    """Running counters for a set of terminal workflows."""
+
+    total: int = 0
+    by_status: Counter = field(default_factory=Counter)
+    by_root_cause: Counter = field(default_factory=Counter)
+    by_action: Counter = field(default_factory=Counter)
+    action_success: Counter = field(default_factory=Counter)
+    by_target_queue: Counter = field(default_factory=Counter)
+    by_attempts: Counter = field(default_factory=Counter)
+    duration_seconds: QuantileSketch = field(default_factory=QuantileSketch)
+
+    def add(self, state: WorkflowState, root_cause: Optional[str], duration: float) -> None:
+        self.total += 1
+        self.by_status[state.status.value] += 1
+        self.by_attempts[str(state.attempts)] += 1
+        if root_cause:
+            self.by_root_cause[root_cause] += 1
+        for action in state.actions:
+            self.by_action[action.name] += 1
+            if action.success:
+                self.action_success[action.name] += 1
+        if state.escalation and state.escalation.required:
+            self.by_target_queue[state.escalation.target_queue or "unassigned"] += 1
+        self.duration_seconds.add(duration)
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {
+            "total": self.total,
+            "self_heal_rate": _rate(self.by_status[WorkflowStatus.completed.value], self.total),
+            "escalation_rate": _rate(self.by_status[WorkflowStatus.escalated.value], self.total),
+            # Deadline overruns are failures too; they are also reported on their own
+            "failure_rate": _rate(
+                self.by_status[WorkflowStatus.failed.value] + self.by_status[WorkflowStatus.timed_out.value],
+                self.total,
+            ),
+            "timeout_rate": _rate(self.by_status[WorkflowStatus.timed_out.value], self.total),
+            "cancellation_rate": _rate(self.by_status[WorkflowStatus.cancelled.value], self.total),
+            "by_status": dict(self.by_status),
+            "root_causes": dict(self.by_root_cause),
+            "actions": {
+                name: {"executed": count, "success_rate": _rate(self.action_success[name], count)}
+                for name, count in self.by_action.items()
+            },
+            "escalation_queues": dict(self.by_target_queue),
+            "attempts": dict(self.by_attempts),
+            "duration_seconds": self.duration_seconds.summary(),
+        }
+
+
+@dataclass
+class _WindowBucket:
+    start: datetime
+    total: int = 0
+    completed: int = 0
+    escalated: int = 0
+    failed: int = 0
+    cancelled: int = 0
+    timed_out: int = 0
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {
+            "start": self.start.isoformat(),
+            "total": self.total,
+            "completed": self.completed,
+            "escalated": self.escalated,
+            "failed": self.failed,
+            "cancelled": self.cancelled,
+            "timed_out": self.timed_out,
+        }
+
+
+class _TumblingWindows:
+    """Fixed-size tumbling windows; only the newest ``retention`` buckets are kept."""
+
+    def __init__(self, width_seconds: int, retention: int) -> None:
+        self._width = width_seconds
+        self._buckets: Deque[_WindowBucket] = deque(maxlen=retention)
+
+    def add(self, ts: datetime, status: WorkflowStatus) -> None:
+        # Timestamps in this service are naive UTC; keep bucket labels in UTC
+        # regardless of the host's local time zone
+        if ts.tzinfo is None:
+            ts = ts.replace(tzinfo=timezone.utc)
+        epoch = int(ts.timestamp())
+        start = datetime.fromtimestamp(epoch - epoch % self._width, tz=timezone.utc).replace(tzinfo=None)
+
+        if not self._buckets or self._buckets[-1].start < start:
+            self._buckets.append(_WindowBucket(start=start))
+            bucket = self._buckets[-1]
+        else:
+            # Late arrivals land in their own bucket if it is still retained
+            bucket = next((b for b in reversed(self._buckets) if b.start == start), None)
+            if bucket is None:
+                return
+
+        bucket.total += 1
+        if status == WorkflowStatus.completed:
+            bucket.completed += 1
+        elif status == WorkflowStatus.escalated:
+            bucket.escalated += 1
+        elif status == WorkflowStatus.failed:
+            bucket.failed += 1
+        elif status == WorkflowStatus.cancelled:
+            bucket.cancelled += 1
+        elif status == WorkflowStatus.timed_out:
+            bucket.timed_out += 1
+
+    def snapshot(self) -> List[Dict[str, Any]]:
+        return [b.snapshot() for b in self._buckets]
+
+
+class OutcomeAnalytics:
+    """
+    Incrementally maintained outcome aggregates for executive dashboards.
+
+    The engine calls ``record`` once per workflow when it reaches a terminal
+    state; reads never scan workflow history, so ``snapshot`` cost depends only
+    on the number of distinct keys (workflow types, root causes, actions...).
+    """
+
+    def __init__(self, minute_retention: int = 60, hour_retention: int = 48) -> None:
+        self._overall = _OutcomeAggregate()
+        self._by_type: Dict[str, _OutcomeAggregate] = {}
+        self._minutes = _TumblingWindows(60, minute_retention)
+        self._hours = _TumblingWindows(3600, hour_retention)
+
+    def record(self, state: WorkflowState) -> None:
+        workflow_type = state.workflow_type.value
+        root_cause, duration = self._extract(state)
+
+        self._overall.add(state, root_cause, duration)
+        self._by_type.setdefault(workflow_type, _OutcomeAggregate()).add(state, root_cause, duration)
+        self._minutes.add(state.updated_at, state.status)
+        self._hours.add(state.updated_at, state.status)
+
+    @staticmethod
+    def _extract(state: WorkflowState) -> Tuple[Optional[str], float]:
+        diag = (state.diagnosis or {}).get(state.workflow_type.value, {})
+        root_cause = diag.get("root_cause") if isinstance(diag, dict) else None
+        duration = (state.updated_at - state.created_at).total_seconds()
+        return root_cause, duration
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {
+            "overall": self._overall.snapshot(),
+            "by_workflow_type": {name: agg.snapshot() for name, agg in self._by_type.items()},
+            "windows": {
+                "minute": self._minutes.snapshot(),
+                "hour": self._hours.snapshot(),
+            },
+        }
+
+
+def _rate(part: int, whole: int) -> Optional[float]:
+    return round(part / whole, 4) if whole else None
@@ -0,0 +1,140 @@
+"""
+Benchmark for the bulk telemetry ingest path.
+
+Run with:
+
+    python -m app.bench_ingest --devices 100000
+
+Reports devices/sec for NDJSON and binary batch bodies (initial load, a
+follow-up pass where ~10% of devices change, an identical resend and a stale
+replay) plus memory per stored device, both for the bare store and for the
+store with telemetry history attached as the API configures it.
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import gc
+import json
+import random
+import time
+import tracemalloc
+from datetime import datetime, timedelta
+from typing import Any, AsyncIterator, Dict, List, Tuple
+
+from .telemetry_history import TelemetryHistory
+from .telemetry_ingest import BATCH_CONTENT_TYPE, NDJSON_CONTENT_TYPE, TelemetryStore, encode_batch, ingest_stream
+
+_ERROR_CODES = ["INK_AUTH_01", "INK_FW_12", "NET_DHCP_3", "SPOOL_9"]
+
+
+def _fleet(devices: int, base: datetime) -> List[Tuple[str, Dict[str, Any]]]:
+    rng = random.Random(42)
+    rows = []
+    for i in range(devices):
+        online = rng.random() > 0.05
+        rows.append(
+            (
+                f"printer-{i:07d}",
+                {
+                    "online": online,
+                    "last_heartbeat_ts": (base + timedelta(seconds=i % 60)).isoformat(),
+                    "error_codes": [] if online else [rng.choice(_ERROR_CODES)],
+                    "ink_level_cyan": 80,
+                    "ink_level_magenta": 75,
+                    "ink_level_yellow": 60,
+                    "ink_level_black": 40,
+                    "spooler_healthy": True,
+                    "network_reachable": online,
+                },
+            )
+        )
+    return rows
+
+
+def _update(
+    rows: List[Tuple[str, Dict[str, Any]]], shift: timedelta, change_ratio: float
+) -> List[Tuple[str, Dict[str, Any]]]:
+    """Resend every device; only ``change_ratio`` of them report a new heartbeat and state."""
+    rng = random.Random(7)
+    updated = []
+    for device_id, t in rows:
+        t = dict(t)
+        if rng.random() < change_ratio:
+            t["online"] = not t["online"]
+            t["network_reachable"] = t["online"]
+            t["error_codes"] = [] if t["online"] else [rng.choice(_ERROR_CODES)]
+            t["last_heartbeat_ts"] = (datetime.fromisoformat(t["last_heartbeat_ts"]) + shift).isoformat()
+        updated.append((device_id, t))
+    return updated
+
+
+def _ndjson(rows: List[Tuple[str, Dict[str, Any]]]) -> bytes:
+    return b"".join(
+        json.dumps({"device_id": d, "telemetry": t}, separators=(",", ":")).encode() + b"\n" for d, t in rows
+    )
+
+
+def _binary(rows: List[Tuple[str, Dict[str, Any]]], rows_per_frame: int = 5000) -> bytes:
+    return b"".join(encode_batch(rows[i : i + rows_per_frame]) for i in range(0, len(rows), rows_per_frame))
+
+
+async def _chunks(body: bytes, size: int = 64 * 1024) -> AsyncIterator[bytes]:
+    for i in range(0, len(body), size):
+        yield body[i : i + size]
+
+
+async def _run(label: str, store: TelemetryStore, body: bytes, content_type: str) -> None:
+    start = time.perf_counter()
+    stats = await ingest_stream(store, _chunks(body), content_type)
+    elapsed = time.perf_counter() - start
+    print(
+        f"{label:<40} {stats.received / elapsed:>12,.0f} devices/s  "
+        f"body {len(body) / max(stats.received, 1):>6.1f} B/device  {stats.as_dict()}"
+    )
+
+
+async def main(devices: int) -> None:
+    base = datetime.utcnow()
+    initial = _fleet(devices, base)
+    update = _update(initial, timedelta(minutes=1), change_ratio=0.1)
+
+    for fmt, encode, content_type in (
+        ("ndjson", _ndjson, NDJSON_CONTENT_TYPE),
+        ("binary", _binary, BATCH_CONTENT_TYPE),
+    ):
+        initial_body, update_body = encode(initial), encode(update)
+        # The API attaches the fleet history to its store; the bare store is
+        # reported alongside to show what the history costs
+        for config, with_history in (("store", False), ("store+history", True)):
+            label = f"{fmt} {config}"
+
+            def new_store() -> TelemetryStore:
+                return TelemetryStore(history=TelemetryHistory() if with_history else None)
+
+            store = new_store()
+            await _run(f"{label} initial load", store, initial_body, content_type)
+            await _run(f"{label} update (10% changed)", store, update_body, content_type)
+            # Resending identical state exercises the delta-suppression path only
+            await _run(f"{label} resend (unchanged)", store, update_body, content_type)
+            # Replaying the initial load: devices that moved on are rejected by last-write-wins
+            await _run(f"{label} stale replay", store, initial_body, content_type)
+
+            # Memory is measured on a separate load since tracing slows ingest down
+            del store
+            gc.collect()
+            tracemalloc.start()
+            store = new_store()
+            await ingest_stream(store, _chunks(initial_body), content_type)
+            gc.collect()
+            current, _ = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+            print(f"{label:<40} {current / len(store):>12,.0f} bytes/device resident\n")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Telemetry ingest benchmark")
+    parser.add_argument("--devices", type=int, default=100_000)
+    args = parser.parse_args()
+    asyncio.run(main(args.devices))
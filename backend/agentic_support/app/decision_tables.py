@@ -0,0 +1,269 @@
+from __future__ import annotations
+
+import itertools
+import json
+import logging
+import os
+from dataclasses import dataclass
+from functools import lru_cache
+from typing import Any, Dict, Optional, Sequence, Tuple
+
+from .models import TelemetrySnapshot, WorkflowType
+from .telemetry_history import DeviceHistory
+
+logger = logging.getLogger("agentic_support.decision_tables")
+
+# Features computed from more than a single telemetry field
+SYNTHETIC_FEATURES = frozenset({"error_class", "ink_empty", "flapping"})
+
+
+# Diagnosis and remediation rules, expressed as data.
+#
+# For each workflow type:
+#   - "features": the telemetry features forming the fingerprint. Boolean
+#     features are the truthiness of a telemetry field; "error_class" is the
+#     first matching entry of "error_prefixes" (or null); "ink_empty" is true
+#     when any reported ink level is 0; "flapping" is true when the device's
+#     telemetry history shows at least "flap_threshold" online -> offline
+#     transitions within "flap_window_seconds".
+#   - "rules": evaluated top to bottom, first match wins; an empty "when"
+#     matches everything.
+#   - "actions": remediation per root cause, with "default" as the fallback.
+#
+# The same structure can be supplied as JSON via DECISION_RULES_PATH and
+# hot-reloaded without a deploy.
+DEFAULT_RULES: Dict[str, Any] = {
+    "printer_offline": {
+        "features": ["online", "network_reachable", "spooler_healthy", "flapping"],
+        "flap_threshold": 3,
+        "flap_window_seconds": 86400,
+        "rules": [
+            {"when": {"online": False, "flapping": True}, "root_cause": "intermittent_connectivity"},
+            {"when": {"online": False, "network_reachable": False}, "root_cause": "network_connectivity_issue"},
+            {"when": {"online": False, "spooler_healthy": False}, "root_cause": "spooler_failure"},
+            {"when": {"online": False}, "root_cause": "unknown_offline_state"},
+            {"when": {}, "root_cause": "intermittent_issue_or_resolved"},
+        ],
+        "actions": {
+            "spooler_failure": {"name": "restart_spooler", "details": "Spooler restart command issued."},
+            "network_connectivity_issue": {"name": "rebind_printer_ip", "details": "Rebound printer to correct IP."},
+            "intermittent_connectivity": {
+                "name": "reserve_printer_ip",
+                "details": "Printer keeps dropping offline; reserved a static IP lease and rebound the printer.",
+            },
+            "unknown_offline_state": {"name": "reset_print_queue", "details": "Cleared and reset print queue."},
+            "default": {
+                "name": "noop",
+                "details": "No obvious issue detected; recorded observation for monitoring.",
+            },
+        },
+    },
+    "ink_error": {
+        "features": ["error_class", "ink_empty"],
+        "error_prefixes": ["INK_AUTH", "INK_FW"],
+        "rules": [
+            {"when": {"error_class": "INK_AUTH"}, "root_cause": "cartridge_not_authentic"},
+            {"when": {"error_class": "INK_FW"}, "root_cause": "firmware_incompatibility"},
+            {"when": {"ink_empty": True}, "root_cause": "empty_cartridge"},
+            {"when": {}, "root_cause": "undetermined_ink_issue"},
+        ],
+        "actions": {
+            "cartridge_not_authentic": {
+                "name": "sync_subscription",
+                "details": "Synced subscription and revalidated cartridge entitlement.",
+            },
+            "firmware_incompatibility": {
+                "name": "refresh_firmware",
+                "details": "Queued firmware refresh for printer and cartridges.",
+            },
+            "empty_cartridge": {
+                "name": "create_replacement_shipment",
+                "details": "Auto-created replacement cartridge shipment for customer.",
+            },
+            "default": {
+                "name": "reset_cartridge_state",
+                "details": "Reset cartridge state and requested device to re-enumerate cartridges.",
+            },
+        },
+    },
+}
+
+
+@dataclass(frozen=True)
+class PlannedAction:
+    name: str
+    details: str
+    success: bool = True
+
+
+@dataclass(frozen=True)
+class Decision:
+    root_cause: str
+    action: PlannedAction
+
+
+class _CompiledWorkflowTable:
+    """Every feature combination of one workflow type, resolved ahead of time."""
+
+    def __init__(self, spec: Dict[str, Any], classifier_cache_size: int) -> None:
+        self.features: Tuple[str, ...] = tuple(spec["features"])
+        self.error_prefixes: Tuple[str, ...] = tuple(spec.get("error_prefixes", ()))
+        self.flap_threshold: int = spec.get("flap_threshold", 3)
+        self.flap_window_seconds: float = spec.get("flap_window_seconds", 86400)
+        self.actions: Dict[str, PlannedAction] = {
+            root: PlannedAction(name=a["name"], details=a["details"], success=a.get("success", True))
+            for root, a in spec["actions"].items()
+        }
+        self.default_action = self.actions.get("default")
+        self._validate(spec["rules"])
+
+        self.table: Dict[Tuple[Any, ...], Decision] = {}
+        for fingerprint in itertools.product(*(self._domain(f) for f in self.features)):
+            values = dict(zip(self.features, fingerprint))
+            root = next(
+                (r["root_cause"] for r in spec["rules"] if all(values.get(k) == v for k, v in r["when"].items())),
+                None,
+            )
+            if root is None:
+                raise ValueError(f"No rule matches fingerprint {values}")
+            action = self.actions.get(root, self.default_action)
+            if action is None:
+                raise ValueError(f"No action configured for root cause {root!r}")
+            self.table[fingerprint] = Decision(root_cause=root, action=action)
+
+        # Error-code lists repeat heavily across a fleet; classify each distinct
+        # list once.
+        self.classify_error_codes = lru_cache(maxsize=classifier_cache_size)(self._classify_error_codes)
+
+    def _validate(self, rules: Sequence[Dict[str, Any]]) -> None:
+        """Reject unknown features and conditions that could never be evaluated."""
+        for feature in self.features:
+            if feature not in SYNTHETIC_FEATURES and feature not in TelemetrySnapshot.model_fields:
+                raise ValueError(f"Unknown feature {feature!r}")
+        for rule in rules:
+            for key, value in rule["when"].items():
+                if key not in self.features:
+                    raise ValueError(f"Rule for {rule['root_cause']!r} uses undeclared feature {key!r}")
+                if value not in self._domain(key):
+                    raise ValueError(f"Rule for {rule['root_cause']!r} has {key}={value!r} outside {self._domain(key)}")
+
+    def _domain(self, feature: str) -> Sequence[Any]:
+        if feature == "error_class":
+            return (*self.error_prefixes, None)
+        return (True, False)
+
+    def _classify_error_codes(self, codes: Tuple[str, ...]) -> Optional[str]:
+        for prefix in self.error_prefixes:
+            if any(code.startswith(prefix) for code in codes):
+                return prefix
+        return None
+
+    def fingerprint(
+        self, t: TelemetrySnapshot, history: Optional[DeviceHistory] = None, now: Optional[float] = None
+    ) -> Tuple[Any, ...]:
+        values = []
+        for feature in self.features:
+            if feature == "flapping":
+                values.append(
+                    history is not None and history.flap_count(self.flap_window_seconds, now) >= self.flap_threshold
+                )
+            elif feature == "error_class":
+                values.append(self.classify_error_codes(tuple(t.error_codes)))
+            elif feature == "ink_empty":
+                values.append(
+                    any(
+                        level == 0
+                        for level in (t.ink_level_cyan, t.ink_level_magenta, t.ink_level_yellow, t.ink_level_black)
+                    )
+                )
+            else:
+                values.append(bool(getattr(t, feature)))
+        return tuple(values)
+
+
+class DecisionTables:
+    """
+    Precomputed diagnosis / remediation tables keyed by telemetry fingerprint.
+
+    ``decide`` is a fingerprint computation plus a dict lookup. ``reload``
+    recompiles from the rules file and swaps the tables in one assignment, so
+    in-flight lookups always see a consistent rule set.
+    """
+
+    def __init__(
+        self,
+        rules: Optional[Dict[str, Any]] = None,
+        path: Optional[str] = None,
+        classifier_cache_size: int = 4096,
+    ) -> None:
+        self._path = path
+        self._cache_size = classifier_cache_size
+        self._mtime: Optional[float] = os.path.getmtime(path) if path else None
+        self._tables = self._compile(rules if rules is not None else self._read_rules())
+
+    @classmethod
+    def from_env(cls) -> "DecisionTables":
+        return cls(path=os.getenv("DECISION_RULES_PATH"))
+
+    def _read_rules(self) -> Dict[str, Any]:
+        if not self._path:
+            return DEFAULT_RULES
+        with open(self._path, "r", encoding="utf-8") as fh:
+            return json.load(fh)
+
+    def _compile(self, rules: Dict[str, Any]) -> Dict[WorkflowType, _CompiledWorkflowTable]:
+        return {
+            WorkflowType(name): _CompiledWorkflowTable(spec, self._cache_size)
+            for name, spec in rules.items()
+        }
+
+    def reload(self) -> bool:
+        """
+        Recompile from the rules file if it changed on disk.
+
+        Returns True if new tables were installed. Invalid rules raise and leave
+        the current tables in place.
+        """
+        if not self._path:
+            return False
+        mtime = os.path.getmtime(self._path)
+        if mtime == self._mtime:
+            return False
+        self._tables = self._compile(self._read_rules())
+        self._mtime = mtime
+        logger.info("Reloaded decision tables from %s", self._path)
+        return True
+
+    def supports(self, workflow_type: WorkflowType) -> bool:
+        return workflow_type in self._tables
+
+    def decide(
+        self,
+        workflow_type: WorkflowType,
+        telemetry: TelemetrySnapshot,
+        history: Optional[DeviceHistory] = None,
+        now: Optional[float] = None,
+    ) -> Decision:
+        """``now`` (epoch seconds) ends history windows; defaults to the history's clock."""
+        table = self._tables[workflow_type]
+        return table.table[table.fingerprint(telemetry, history, now)]
+
+    def action_for(self, workflow_type: WorkflowType, root_cause: Optional[str]) -> Optional[PlannedAction]:
+        """Remediation for a root cause, falling back to the workflow's default action."""
+        table = self._tables.get(workflow_type)
+        if table is None:
+            return None
+        return table.actions.get(root_cause or "default", table.default_action)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            wt.value: {
+                "entries": len(t.table),
+                "classifier_cache": t.classify_error_codes.cache_info()._asdict(),
+            }
+            for wt, t in self._tables.items()
+        }
+
+
+# Shared instance used by the agents and the reload endpoint
+decision_tables = DecisionTables.from_env()
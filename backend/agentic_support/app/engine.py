@@ -1,18 +1,23 @@
 from __future__ import annotations
 
 import asyncio
+import logging
+import os
 import uuid
-from datetime import datetime
-from typing import Dict
+from datetime import datetime, timedelta
+from typing import Dict, Optional, Tuple
 
 from .agents import (
     ActionExecutionAgent,
+    BaseAgent,
     DiagnosticAgent,
     EscalationDecisionAgent,
     IntentDetectionAgent,
     VerificationAgent,
     WorkflowContext,
 )
+from .analytics import OutcomeAnalytics
+from .escalation_outbox import EscalationOutbox
 from .models import (
     WorkflowState,
     WorkflowStatus,
@@ -20,6 +25,30 @@ from .models import (
     WorkflowType,
     WorkflowTriggerRequest,
 )
+from .registry import WorkflowDefinition, workflow_registry
+from .telemetry_history import TelemetryHistory, telemetry_history
+from .traffic_recorder import TrafficRecorder
+
+logger = logging.getLogger("agentic_support.engine")
+
+_TERMINAL_STATUSES = frozenset(
+    {
+        WorkflowStatus.completed,
+        WorkflowStatus.escalated,
+        WorkflowStatus.failed,
+        WorkflowStatus.cancelled,
+        WorkflowStatus.timed_out,
+    }
+)
+
+
+class WorkflowTimeoutError(Exception):
+    """Raised when a stage or the whole workflow exceeds its deadline."""
+
+    def __init__(self, stage: WorkflowStage, timeout: float) -> None:
+        super().__init__(f"Deadline exceeded in stage {stage.value} after {timeout:.1f}s")
+        self.stage = stage
+        self.timeout = timeout
 
 
 class WorkflowEngine:
@@ -31,9 +60,25 @@ class WorkflowEngine:
     explicitly to keep it easy to follow and test.
     """
 
-    def __init__(self) -> None:
+    def __init__(
+        self,
+        history: Optional[TelemetryHistory] = None,
+        outbox: Optional[EscalationOutbox] = None,
+        recorder: Optional[TrafficRecorder] = None,
+    ) -> None:
         self._runs: Dict[str, WorkflowState] = {}
+        self._tasks: Dict[str, asyncio.Task] = {}
         self._lock = asyncio.Lock()
+        # Bounds concurrently executing runs; excess runs wait in "pending"
+        self._slots = asyncio.Semaphore(int(os.getenv("MAX_CONCURRENT_WORKFLOWS", "100")))
+        self.analytics = OutcomeAnalytics()
+        # Escalations are handed to CRM / ticketing asynchronously via an outbox
+        # (in-memory unless a durable one is passed in)
+        self.outbox = outbox if outbox is not None else EscalationOutbox()
+        # Optional capture of incoming traffic and outcomes for app/replay.py
+        self.recorder = recorder
+        # Fleet telemetry history read by diagnostics (trends, flapping)
+        self.history = history if history is not None else telemetry_history
 
         # Reusable agent instances
         self.intent_agent = IntentDetectionAgent()
@@ -42,6 +87,9 @@ class WorkflowEngine:
         self.verification_agent = VerificationAgent()
         self.escalation_agent = EscalationDecisionAgent()
 
+        # Freeze workflow registrations into the dispatch table
+        workflow_registry.compile()
+
     async def trigger(self, req: WorkflowTriggerRequest) -> WorkflowState:
         """
         Create a new workflow instance and start orchestration in the background.
@@ -49,6 +97,8 @@ class WorkflowEngine:
         workflow_type = req.workflow_type or await self._infer_workflow_type(req)
         workflow_id = str(uuid.uuid4())
 
+        # The whole run must finish within the customer's SLA
+        sla_seconds = req.entitlement.sla_minutes * 60
         state = WorkflowState(
             id=workflow_id,
             workflow_type=workflow_type,
@@ -56,6 +106,7 @@ class WorkflowEngine:
             stage=WorkflowStage.triggered,
             diagnosis={"intent": workflow_type.value},
         )
+        state.deadline_at = state.created_at + timedelta(seconds=sla_seconds)
 
         async with self._lock:
             self._runs[workflow_id] = state
@@ -67,12 +118,57 @@ class WorkflowEngine:
             device=req.device,
             telemetry=req.telemetry,
             entitlement=req.entitlement,
+            history=self.history.get(req.device.device_id),
+            as_of=self.history.now(),
+            deadline=asyncio.get_running_loop().time() + sla_seconds,
         )
 
-        # Fire-and-forget orchestration in the background
-        asyncio.create_task(self._run_workflow(ctx, state))
+        # Orchestration runs in the background; the task is kept so it can be cancelled
+        task = asyncio.create_task(self._run_workflow(ctx, state))
+        self._tasks[workflow_id] = task
+        task.add_done_callback(lambda _: self._tasks.pop(workflow_id, None))
         return state
 
+    async def cancel(self, workflow_id: str, reason: Optional[str] = None) -> Tuple[Optional[WorkflowState], bool]:
+        """
+        Cancel a running or pending workflow.
+
+        Returns ``(state, cancelled)``: state is None if the workflow is
+        unknown, and cancelled is False if it had already finished before this
+        call (its state is returned unchanged).
+        """
+        state = await self.get_state(workflow_id)
+        task = self._tasks.get(workflow_id)
+        if state is None or task is None or task.done() or state.status in _TERMINAL_STATUSES:
+            # A run with a terminal status may still be in its outcome hooks;
+            # it has finished and must not be interrupted
+            return state, False
+
+        task.cancel()
+        # Wait for the run to unwind so its resources are released before returning
+        await asyncio.wait({task})
+
+        # A task cancelled before its first step never enters _run_workflow, so
+        # neither its cancellation handler nor its outcome hooks have run
+        if state.status in (WorkflowStatus.pending, WorkflowStatus.running):
+            state.resolution_reason = reason or "Cancelled by request."
+            self._end_run(state, WorkflowStatus.cancelled, WorkflowStage.cancelled, "info", "Workflow cancelled")
+            await self._persist(state)
+            await self._record_outcome(state)
+            return state, True
+
+        if state.status != WorkflowStatus.cancelled:
+            return state, False
+        state.resolution_reason = reason or "Cancelled by request."
+        return state, True
+
+    async def wait(self, workflow_id: str) -> Optional[WorkflowState]:
+        """Wait until a workflow reaches a terminal state and return it."""
+        task = self._tasks.get(workflow_id)
+        if task is not None:
+            await asyncio.wait({task})
+        return await self.get_state(workflow_id)
+
     async def _infer_workflow_type(self, req: WorkflowTriggerRequest) -> WorkflowType:
         # Simple reuse of the IntentDetectionAgent
         tmp_state = WorkflowState(
@@ -102,29 +198,37 @@ class WorkflowEngine:
           - Verification
           - (optional) second attempt
           - Escalation decision
+
+        Every stage runs under a deadline (the workflow's stage timeout, capped by
+        the time left until the SLA deadline). Timeouts and cancellation end the
+        run cleanly and release its queue slot and per-run resources.
         """
         try:
-            state.status = WorkflowStatus.running
-            state.stage = WorkflowStage.diagnosing
-            state.attempts = 1
+            async with self._slots, ctx.resources:
+                state.status = WorkflowStatus.running
+                state.stage = WorkflowStage.diagnosing
+                state.attempts = 1
 
-            # 1) Diagnostic
-            state = await self.diagnostic_agent.run(ctx, state)
-            await self._persist(state)
+                definition = workflow_registry.get(ctx.workflow_type)
+                if definition is None:
+                    raise ValueError(f"Unsupported workflow type: {ctx.workflow_type.value}")
 
-            # 2) Action
-            state = await self.action_agent.run(ctx, state)
-            await self._persist(state)
+                # 1) Diagnostic
+                state = await self._run_stage(self.diagnostic_agent, definition, ctx, state)
 
-            # 3) Verification
-            state = await self.verification_agent.run(ctx, state)
-            await self._persist(state)
+                # 2) Action
+                state = await self._run_stage(self.action_agent, definition, ctx, state)
 
-            # 4) Optional second attempt if verification failed and rules allow
-            if state.verification and not state.verification.success:
-                state.attempts += 1
-                # For printer_offline we allow up to 2 attempts before escalation
-                if ctx.workflow_type == WorkflowType.printer_offline and state.attempts <= 2:
+                # 3) Verification
+                state = await self._run_stage(self.verification_agent, definition, ctx, state)
+
+                # 4) Further attempts while verification fails, up to the workflow's limit
+                while (
+                    state.verification
+                    and not state.verification.success
+                    and state.attempts < definition.max_attempts
+                ):
+                    state.attempts += 1
                     state.stage = WorkflowStage.diagnosing
                     state.logs.append(
                         {
@@ -135,32 +239,106 @@ class WorkflowEngine:
                         }
                     )
                     # Re-run diagnostics and actions with updated attempt count
-                    state = await self.diagnostic_agent.run(ctx, state)
-                    await self._persist(state)
-                    state = await self.action_agent.run(ctx, state)
-                    await self._persist(state)
-                    state = await self.verification_agent.run(ctx, state)
-                    await self._persist(state)
-
-            # 5) Escalation / Closure
-            state = await self.escalation_agent.run(ctx, state)
-            # Generate summary & resolution text
-            state = self._generate_summary(state)
+                    state = await self._run_stage(self.diagnostic_agent, definition, ctx, state)
+                    state = await self._run_stage(self.action_agent, definition, ctx, state)
+                    state = await self._run_stage(self.verification_agent, definition, ctx, state)
+
+                # 5) Escalation / Closure
+                state = await self._run_stage(self.escalation_agent, definition, ctx, state)
+                # Generate summary & resolution text
+                state = self._generate_summary(state)
+                await self._persist(state)
+
+        except asyncio.CancelledError:
+            self._end_run(state, WorkflowStatus.cancelled, WorkflowStage.cancelled, "info", "Workflow cancelled")
+            await self._persist(state)
+
+        except WorkflowTimeoutError as exc:
+            self._end_run(
+                state,
+                WorkflowStatus.timed_out,
+                WorkflowStage.failed,
+                "error",
+                "Workflow deadline exceeded",
+                timeout_seconds=round(exc.timeout, 3),
+            )
+            state.resolution_reason = str(exc)
             await self._persist(state)
 
         except Exception as exc:  # pragma: no cover - defensive
-            state.status = WorkflowStatus.failed
-            state.stage = WorkflowStage.failed
-            state.logs.append(
-                {
-                    "timestamp": datetime.utcnow(),
-                    "level": "error",
-                    "message": "Workflow execution failed",
-                    "data": {"error": str(exc)},
-                }
+            self._end_run(
+                state, WorkflowStatus.failed, WorkflowStage.failed, "error", "Workflow execution failed", error=str(exc)
             )
             await self._persist(state)
 
+        finally:
+            # Shielded so a late cancel cannot drop an escalation mid-enqueue
+            await asyncio.shield(self._record_outcome(state))
+
+    async def _record_outcome(self, state: WorkflowState) -> None:
+        """
+        Feed a finished run to analytics, the escalation outbox and the recorder.
+        Each hook is isolated so one failing does not skip the others.
+        """
+        state.updated_at = datetime.utcnow()
+        try:
+            self.analytics.record(state)
+        except Exception:
+            logger.exception("Failed to record analytics for workflow %s", state.id)
+        if state.escalation and state.escalation.required:
+            try:
+                await self.outbox.enqueue(state)
+            except Exception:
+                logger.exception("Failed to enqueue escalation for workflow %s", state.id)
+        if self.recorder:
+            try:
+                self.recorder.record_outcome(state)
+            except Exception:
+                logger.exception("Failed to record outcome of workflow %s", state.id)
+
+    async def _run_stage(
+        self,
+        agent: BaseAgent,
+        definition: WorkflowDefinition,
+        ctx: WorkflowContext,
+        state: WorkflowState,
+    ) -> WorkflowState:
+        """Run one agent under the stage deadline and persist the result."""
+        timeout = definition.stage_timeout_seconds
+        if ctx.deadline is not None:
+            timeout = min(timeout, ctx.deadline - asyncio.get_running_loop().time())
+        if timeout <= 0:
+            raise WorkflowTimeoutError(state.stage, 0.0)
+
+        try:
+            state = await asyncio.wait_for(agent.run(ctx, state), timeout)
+        except asyncio.TimeoutError:
+            raise WorkflowTimeoutError(state.stage, timeout) from None
+        await self._persist(state)
+        return state
+
+    @staticmethod
+    def _end_run(
+        state: WorkflowState,
+        status: WorkflowStatus,
+        stage: WorkflowStage,
+        level: str,
+        message: str,
+        **data: object,
+    ) -> None:
+        # Record the stage the run was in before it is overwritten
+        data["stage"] = state.stage.value
+        state.status = status
+        state.stage = stage
+        state.logs.append(
+            {
+                "timestamp": datetime.utcnow(),
+                "level": level,
+                "message": message,
+                "data": data,
+            }
+        )
+
     async def get_state(self, workflow_id: str) -> Optional[WorkflowState]:
         async with self._lock:
             return self._runs.get(workflow_id)
@@ -178,10 +356,8 @@ class WorkflowEngine:
         Produce a human-readable case summary and resolution reason.
         In production this could be delegated to an LLM using the logs as context.
         """
-        if state.workflow_type == WorkflowType.printer_offline:
-            base = "Printer offline self-heal workflow executed."
-        else:
-            base = "Printer ink error self-heal workflow executed."
+        definition = workflow_registry.get(state.workflow_type)
+        base = definition.summary(state) if definition else f"{state.workflow_type.value} workflow executed."
 
         actions = ", ".join(a.name for a in state.actions) or "no actions taken"
         verification = "succeeded" if state.verification and state.verification.success else "did not fully succeed"
@@ -198,6 +374,9 @@ class WorkflowEngine:
 
 
 # Singleton engine instance used by FastAPI routes
-engine = WorkflowEngine()
+engine = WorkflowEngine(
+    outbox=EscalationOutbox(path=os.getenv("ESCALATION_OUTBOX_PATH")),
+    recorder=TrafficRecorder.from_env(),
+)
 
 
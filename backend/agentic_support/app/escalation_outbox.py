@@ -0,0 +1,373 @@
+from __future__ import annotations
+
+import asyncio
+import base64
+import gzip
+import json
+import logging
+import os
+import random
+import time
+import urllib.request
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional, Protocol
+
+from .analytics import QuantileSketch
+from .models import WorkflowState
+
+logger = logging.getLogger("agentic_support.outbox")
+
+
+@dataclass
+class OutboxEntry:
+    """A single pending escalation ticket, keyed by workflow_id."""
+
+    workflow_id: str
+    target_queue: str
+    payload: Dict[str, Any]
+    enqueued_at: float = field(default_factory=time.time)
+    attempts: int = 0
+    next_attempt_at: float = 0.0
+
+    def to_record(self) -> Dict[str, Any]:
+        return {
+            "op": "enqueue",
+            "workflow_id": self.workflow_id,
+            "target_queue": self.target_queue,
+            "payload": self.payload,
+            "enqueued_at": self.enqueued_at,
+        }
+
+
+def build_ticket_payload(state: WorkflowState) -> Dict[str, Any]:
+    """
+    Serialize a workflow into a ticket body.
+
+    The structured logs are the bulk of the payload, so they are gzip-compressed
+    and base64-encoded; the rest of the WorkflowState is attached as-is.
+    """
+    body = state.model_dump(mode="json", warnings=False)
+    raw_logs = json.dumps(body.pop("logs")).encode("utf-8")
+    body["logs_gzip_b64"] = base64.b64encode(gzip.compress(raw_logs)).decode("ascii")
+    body["external_reference"] = state.id
+    return body
+
+
+class EscalationOutbox:
+    """
+    Durable outbox of escalations awaiting delivery to CRM / ticketing.
+
+    Every enqueue and acknowledgement is appended to a JSON-lines journal, so
+    undelivered tickets survive a restart. Journal writes run in a worker
+    thread, and each acknowledged batch is written with a single fsync.
+    Delivered ids are remembered for deduplication for ``dedupe_ttl_seconds``
+    (at most ``max_delivered`` of them). Without a path the outbox is purely
+    in-memory (useful for tests and local demos).
+    """
+
+    def __init__(
+        self,
+        path: Optional[str] = None,
+        compact_after: int = 1000,
+        dedupe_ttl_seconds: float = 7 * 24 * 3600,
+        max_delivered: int = 100_000,
+    ) -> None:
+        self._path = path
+        self._compact_after = compact_after
+        self._dedupe_ttl = dedupe_ttl_seconds
+        self._max_delivered = max_delivered
+        self._pending: "OrderedDict[str, OutboxEntry]" = OrderedDict()
+        # workflow_id -> delivery time, oldest first
+        self._delivered: "OrderedDict[str, float]" = OrderedDict()
+        self._acks_since_compact = 0
+        self._journal_lock = asyncio.Lock()
+        self.wakeup = asyncio.Event()
+        self.deduplicated = 0
+
+        if path and os.path.exists(path):
+            self._load()
+
+    def _load(self) -> None:
+        with open(self._path, "rb") as fh:
+            lines = fh.readlines()
+        offset = 0
+        for n, raw in enumerate(lines):
+            line_start, offset = offset, offset + len(raw)
+            if not raw.strip():
+                continue
+            try:
+                record = json.loads(raw)
+            except ValueError:
+                if n < len(lines) - 1:
+                    raise
+                # A crash mid-append leaves a torn last line; drop it so the
+                # next append starts on a clean line
+                logger.warning("Dropping truncated last line of outbox journal %s", self._path)
+                os.truncate(self._path, line_start)
+                break
+            if not raw.endswith(b"\n"):
+                with open(self._path, "ab") as fh:
+                    fh.write(b"\n")
+
+            workflow_id = record["workflow_id"]
+            if record["op"] == "enqueue" and workflow_id not in self._delivered:
+                self._pending[workflow_id] = OutboxEntry(
+                    workflow_id=workflow_id,
+                    target_queue=record["target_queue"],
+                    payload=record["payload"],
+                    enqueued_at=record["enqueued_at"],
+                )
+            elif record["op"] == "ack":
+                self._pending.pop(workflow_id, None)
+                self._remember_delivered(workflow_id, record.get("t", time.time()))
+        self._prune_delivered()
+        logger.info("Recovered %d pending escalations from %s", len(self._pending), self._path)
+
+    def _remember_delivered(self, workflow_id: str, delivered_at: float) -> None:
+        self._delivered[workflow_id] = delivered_at
+        self._delivered.move_to_end(workflow_id)
+
+    def _prune_delivered(self, now: Optional[float] = None) -> None:
+        """Forget the oldest delivered ids once they expire or exceed max_delivered."""
+        cutoff = (time.time() if now is None else now) - self._dedupe_ttl
+        while self._delivered:
+            workflow_id, delivered_at = next(iter(self._delivered.items()))
+            if delivered_at >= cutoff and len(self._delivered) <= self._max_delivered:
+                break
+            del self._delivered[workflow_id]
+
+    @staticmethod
+    def _write_lines(path: str, lines: List[str], mode: str = "a") -> None:
+        with open(path, mode, encoding="utf-8") as fh:
+            fh.write("".join(lines))
+            fh.flush()
+            os.fsync(fh.fileno())
+
+    async def _append(self, records: List[Dict[str, Any]]) -> None:
+        if not self._path or not records:
+            return
+        lines = [json.dumps(r, separators=(",", ":")) + "\n" for r in records]
+        async with self._journal_lock:
+            await asyncio.to_thread(self._write_lines, self._path, lines)
+
+    async def _compact(self) -> None:
+        # Rewrite the journal with only the live entries and the delivered ids
+        # still needed for deduplication.
+        self._prune_delivered()
+        lines = [
+            json.dumps({"op": "ack", "workflow_id": workflow_id, "t": delivered_at}, separators=(",", ":")) + "\n"
+            for workflow_id, delivered_at in self._delivered.items()
+        ]
+        lines.extend(json.dumps(e.to_record(), separators=(",", ":")) + "\n" for e in self._pending.values())
+        tmp_path = f"{self._path}.tmp"
+        async with self._journal_lock:
+            await asyncio.to_thread(self._write_lines, tmp_path, lines, "w")
+            await asyncio.to_thread(os.replace, tmp_path, self._path)
+        self._acks_since_compact = 0
+
+    async def enqueue(self, state: WorkflowState) -> bool:
+        """
+        Record an escalated workflow for delivery.
+
+        Returns False if the workflow is already pending or delivered.
+        """
+        if state.id in self._pending or state.id in self._delivered:
+            self.deduplicated += 1
+            return False
+
+        escalation = state.escalation
+        entry = OutboxEntry(
+            workflow_id=state.id,
+            target_queue=(escalation.target_queue if escalation else None) or "unassigned",
+            payload=build_ticket_payload(state),
+        )
+        self._pending[state.id] = entry
+        try:
+            await self._append([entry.to_record()])
+        except OSError:
+            # Still deliver from memory; only durability across restarts is lost
+            logger.exception("Could not journal escalation %s", state.id)
+        self.wakeup.set()
+        return True
+
+    async def ack(self, workflow_ids: List[str]) -> None:
+        now = time.time()
+        records = []
+        for workflow_id in workflow_ids:
+            if self._pending.pop(workflow_id, None) is None:
+                continue
+            self._remember_delivered(workflow_id, now)
+            records.append({"op": "ack", "workflow_id": workflow_id, "t": now})
+        self._acks_since_compact += len(records)
+        self._prune_delivered(now)
+
+        try:
+            await self._append(records)
+            if self._path and self._acks_since_compact >= self._compact_after:
+                await self._compact()
+        except OSError:
+            # The tickets were delivered; at worst they are re-sent after a restart
+            logger.exception("Could not journal acknowledgement of %d escalations", len(records))
+
+    def due_batches(self, batch_size: int, now: Optional[float] = None) -> Dict[str, List[OutboxEntry]]:
+        """Group due entries per target queue, oldest first, up to batch_size each."""
+        now = time.time() if now is None else now
+        batches: Dict[str, List[OutboxEntry]] = {}
+        for entry in self._pending.values():
+            if entry.next_attempt_at > now:
+                continue
+            batch = batches.setdefault(entry.target_queue, [])
+            if len(batch) < batch_size:
+                batch.append(entry)
+        return batches
+
+    def next_due_in(self, now: Optional[float] = None) -> Optional[float]:
+        if not self._pending:
+            return None
+        now = time.time() if now is None else now
+        return max(0.0, min(e.next_attempt_at for e in self._pending.values()) - now)
+
+    def __len__(self) -> int:
+        return len(self._pending)
+
+
+class TicketingClient(Protocol):
+    async def create_tickets(self, target_queue: str, tickets: List[Dict[str, Any]]) -> None:
+        """Create a batch of tickets; raise on failure so the batch is retried."""
+
+
+class LoggingTicketingClient:
+    """Mock CRM client that only logs; used when no ticketing endpoint is configured."""
+
+    async def create_tickets(self, target_queue: str, tickets: List[Dict[str, Any]]) -> None:
+        logger.info(
+            "Would create %d ticket(s) in %s: %s",
+            len(tickets),
+            target_queue,
+            [t["external_reference"] for t in tickets],
+        )
+
+
+class HttpTicketingClient:
+    """
+    Posts ticket batches as JSON to a ticketing endpoint
+    (e.g. a ServiceNow / Zendesk bulk import API or the local stub server).
+    """
+
+    def __init__(self, url: str, timeout: float = 10.0) -> None:
+        self._url = url
+        self._timeout = timeout
+
+    async def create_tickets(self, target_queue: str, tickets: List[Dict[str, Any]]) -> None:
+        body = json.dumps({"target_queue": target_queue, "tickets": tickets}).encode("utf-8")
+        await asyncio.to_thread(self._post, body)
+
+    def _post(self, body: bytes) -> None:
+        request = urllib.request.Request(
+            self._url,
+            data=body,
+            headers={"Content-Type": "application/json"},
+            method="POST",
+        )
+        with urllib.request.urlopen(request, timeout=self._timeout) as resp:
+            if resp.status >= 300:
+                raise RuntimeError(f"Ticketing endpoint returned HTTP {resp.status}")
+
+
+class EscalationDispatcher:
+    """
+    Background task that drains the outbox in per-queue batches.
+
+    Failed batches are retried with exponential backoff and jitter. Delivery
+    throughput and enqueue-to-delivery latency are tracked for /escalation-metrics.
+    """
+
+    def __init__(
+        self,
+        outbox: EscalationOutbox,
+        client: TicketingClient,
+        batch_size: int = 25,
+        linger_seconds: float = 0.5,
+        base_backoff_seconds: float = 1.0,
+        max_backoff_seconds: float = 60.0,
+    ) -> None:
+        self.outbox = outbox
+        self.client = client
+        self.batch_size = batch_size
+        self.linger_seconds = linger_seconds
+        self.base_backoff_seconds = base_backoff_seconds
+        self.max_backoff_seconds = max_backoff_seconds
+
+        self._task: Optional[asyncio.Task] = None
+        self._started_at: Optional[float] = None
+        self.delivered = 0
+        self.batches_sent = 0
+        self.batch_failures = 0
+        self.latency_seconds = QuantileSketch()
+
+    def start(self) -> None:
+        if self._task is None:
+            self._started_at = time.time()
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is None:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+
+    async def _run(self) -> None:
+        while True:
+            timeout = self.outbox.next_due_in()
+            self.outbox.wakeup.clear()
+            if timeout is None or timeout > 0:
+                try:
+                    await asyncio.wait_for(self.outbox.wakeup.wait(), timeout=timeout)
+                except asyncio.TimeoutError:
+                    pass
+                # Give concurrent escalations a moment to join the same batch
+                await asyncio.sleep(self.linger_seconds)
+            await self.flush()
+
+    async def flush(self) -> None:
+        """Send every due batch once."""
+        batches = self.outbox.due_batches(self.batch_size)
+        await asyncio.gather(*(self._send(queue, entries) for queue, entries in batches.items()))
+
+    async def _send(self, target_queue: str, entries: List[OutboxEntry]) -> None:
+        try:
+            await self.client.create_tickets(target_queue, [e.payload for e in entries])
+        except Exception as exc:
+            self.batch_failures += 1
+            for entry in entries:
+                entry.attempts += 1
+                backoff = min(self.max_backoff_seconds, self.base_backoff_seconds * 2 ** (entry.attempts - 1))
+                entry.next_attempt_at = time.time() + backoff * random.uniform(0.5, 1.0)
+            logger.warning(
+                "Ticket batch for %s failed (%d entries): %s", target_queue, len(entries), exc
+            )
+            return
+
+        now = time.time()
+        for entry in entries:
+            self.latency_seconds.add(now - entry.enqueued_at)
+        await self.outbox.ack([e.workflow_id for e in entries])
+        self.delivered += len(entries)
+        self.batches_sent += 1
+
+    def metrics(self) -> Dict[str, Any]:
+        elapsed = time.time() - self._started_at if self._started_at else 0.0
+        return {
+            "pending": len(self.outbox),
+            "delivered": self.delivered,
+            "deduplicated": self.outbox.deduplicated,
+            "batches_sent": self.batches_sent,
+            "batch_failures": self.batch_failures,
+            "throughput_per_second": round(self.delivered / elapsed, 4) if elapsed else None,
+            "latency_seconds": self.latency_seconds.summary(),
+        }
@@ -1,22 +1,47 @@
 from __future__ import annotations
 
+import asyncio
 import logging
-from typing import Dict
+import os
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Dict
 
-from fastapi import BackgroundTasks, FastAPI, HTTPException
+from fastapi import BackgroundTasks, FastAPI, HTTPException, Request
 from fastapi.middleware.cors import CORSMiddleware
 
+from .decision_tables import decision_tables
 from .engine import engine
+from .escalation_outbox import EscalationDispatcher, HttpTicketingClient, LoggingTicketingClient
 from .models import (
+    CancelWorkflowRequest,
     SimulateTelemetryRequest,
     TriggerWorkflowResponse,
     WorkflowStatusResponse,
     WorkflowTriggerRequest,
 )
+from .telemetry_history import telemetry_history
+from .telemetry_ingest import TelemetryFormatError, TelemetryStore, ingest_stream
 
 logger = logging.getLogger("agentic_support")
 logging.basicConfig(level=logging.INFO)
 
+_ticketing_url = os.getenv("TICKETING_URL")
+dispatcher = EscalationDispatcher(
+    engine.outbox,
+    HttpTicketingClient(_ticketing_url) if _ticketing_url else LoggingTicketingClient(),
+)
+
+
+@asynccontextmanager
+async def lifespan(_: FastAPI) -> AsyncIterator[None]:
+    dispatcher.start()
+    yield
+    await dispatcher.stop()
+    if engine.recorder:
+        # Drains the recorder's writer thread
+        await asyncio.to_thread(engine.recorder.close)
+
+
 app = FastAPI(
     title="Agentic Customer Support Self-Healing API",
     version="0.1.0",
@@ -28,6 +53,7 @@ app = FastAPI(
         "Integrations with CCaaS, device telemetry and CRM systems are mocked via "
         "well-defined boundaries so they can be replaced with real clients later."
     ),
+    lifespan=lifespan,
 )
 
 app.add_middleware(
@@ -53,6 +79,8 @@ async def trigger_workflow(payload: WorkflowTriggerRequest, background: Backgrou
     """
     state = await engine.trigger(payload)
     logger.info("Triggered workflow %s of type %s", state.id, state.workflow_type.value)
+    if engine.recorder:
+        engine.recorder.record_trigger(payload, state.id)
 
     return TriggerWorkflowResponse(
         workflow_id=state.id,
@@ -82,8 +110,26 @@ async def get_workflow_status(workflow_id: str) -> WorkflowStatusResponse:
     return WorkflowStatusResponse(workflow=state)
 
 
-# In-memory telemetry store used for /simulate-telemetry
-_TELEMETRY_STORE: Dict[str, Dict] = {}
+@app.post("/cancel-workflow", response_model=WorkflowStatusResponse)
+async def cancel_workflow(payload: CancelWorkflowRequest) -> WorkflowStatusResponse:
+    """
+    Cancel a pending or running workflow, e.g. once a human agent has helped the customer.
+
+    The background task is cancelled and awaited, so the run's queue slot and any
+    per-run resources are released before this returns. Returns 409 if the
+    workflow had already finished.
+    """
+    state, cancelled = await engine.cancel(payload.workflow_id, payload.reason)
+    if not state:
+        raise HTTPException(status_code=404, detail="Workflow not found")
+    if not cancelled:
+        raise HTTPException(status_code=409, detail=f"Workflow already {state.status.value}")
+    logger.info("Cancelled workflow %s", state.id)
+    return WorkflowStatusResponse(workflow=state)
+
+
+# In-memory telemetry store used for /simulate-telemetry and /ingest-telemetry
+telemetry_store = TelemetryStore(history=telemetry_history)
 
 
 @app.post("/simulate-telemetry")
@@ -95,11 +141,74 @@ async def simulate_telemetry(payload: SimulateTelemetryRequest) -> Dict[str, str
       - a webhook from a device telemetry platform, or
       - a polling job that reads from an IoT / streaming source (e.g., Kafka, MQTT).
     """
-    _TELEMETRY_STORE[payload.device_id] = payload.telemetry.model_dump()
+    telemetry_store.apply(payload.device_id, payload.telemetry.model_dump(), replace=True)
+    if engine.recorder:
+        engine.recorder.record_telemetry(payload)
     logger.info("Updated simulated telemetry for device %s", payload.device_id)
     return {"status": "ok", "device_id": payload.device_id}
 
 
+@app.post("/ingest-telemetry")
+async def ingest_telemetry(request: Request) -> Dict[str, Any]:
+    """
+    Bulk telemetry ingest for a device fleet.
+
+    The body is streamed and decoded incrementally, never buffered as a whole.
+    Supported content types:
+      - application/x-ndjson: one {"device_id": ..., "telemetry": {...}} object per line
+      - application/x-telemetry-batch: length-prefixed binary columnar frames
+        (see app/telemetry_ingest.py for the layout and encode_batch)
+
+    Updates are last-write-wins by last_heartbeat_ts; only changed fields are
+    published to downstream subscribers.
+    """
+    try:
+        stats = await ingest_stream(telemetry_store, request.stream(), request.headers.get("content-type"))
+    except TelemetryFormatError as exc:
+        raise HTTPException(status_code=400, detail=str(exc))
+    logger.info("Ingested telemetry batch: %s", stats.as_dict())
+    return {"status": "ok", **stats.as_dict()}
+
+
+@app.get("/analytics")
+async def analytics() -> Dict[str, Any]:
+    """
+    Rolling outcome analytics for executive dashboards.
+
+    Aggregates are updated incrementally as each workflow reaches a terminal state,
+    so this endpoint never scans workflow history. It returns:
+      - self-heal, escalation and failure rates (overall and per workflow type)
+      - root cause, action success, escalation queue and attempt distributions
+      - duration quantiles from a streaming sketch
+      - per-minute and per-hour tumbling window counts
+    """
+    return engine.analytics.snapshot()
+
+
+@app.get("/escalation-metrics")
+async def escalation_metrics() -> Dict[str, Any]:
+    """
+    Delivery metrics for the escalation outbox: pending backlog, delivered and
+    deduplicated tickets, batch failures, throughput and enqueue-to-delivery latency.
+    """
+    return dispatcher.metrics()
+
+
+@app.post("/reload-decision-tables")
+async def reload_decision_tables() -> Dict[str, Any]:
+    """
+    Recompile the diagnosis / remediation decision tables from DECISION_RULES_PATH.
+
+    Rules are data, so they can be changed without a deploy. Invalid rules are
+    rejected and the current tables stay in place.
+    """
+    try:
+        reloaded = decision_tables.reload()
+    except (OSError, ValueError, KeyError, TypeError) as exc:
+        raise HTTPException(status_code=400, detail=f"Invalid decision rules: {exc}")
+    return {"reloaded": reloaded, "tables": decision_tables.stats()}
+
+
 @app.get("/health")
 async def health() -> Dict[str, str]:
     return {"status": "ok"}
@@ -116,12 +225,26 @@ CCaaS / Contact Center (e.g., Genesys, Twilio, Amazon Connect)
   - Agent assist widgets (send the current conversation transcript)
   - Bot flows as a 'self-heal' action before routing to a human
 
+- When a human agent resolves the case first, call /cancel-workflow to stop
+  the automated run. Runs are also bounded by per-stage timeouts and an
+  overall deadline derived from the entitlement's sla_minutes; at most
+  MAX_CONCURRENT_WORKFLOWS runs execute at once.
+
 - The WorkflowState.summary and resolution_reason fields can be surfaced
   in an agent desktop UI as a ready-made wrap-up note or guidance script.
 
 Device Telemetry Platforms
 ---------------------------
-- Replace the in-memory _TELEMETRY_STORE and TelemetrySnapshot with a thin
+- /ingest-telemetry accepts streaming NDJSON or binary batch uploads from a
+  fleet; TelemetryStore.subscribe() exposes changed-field deltas to consumers.
+
+- Every accepted update is also appended to the device's packed history
+  (app/telemetry_history.py): a fixed-size ring of recent samples plus hourly
+  downsampled buckets (~3.5 KB of packed arrays, ~6 KB resident per device).
+  DiagnosticAgent reads flap counts, heartbeat gaps and ink depletion rates
+  from it, and the decision tables can key rules on the "flapping" feature.
+
+- Replace the in-memory TelemetryStore and TelemetrySnapshot with a thin
   adapter around your real telemetry source:
   - e.g., a service that queries a device management API
   - or a subscriber to telemetry events on Kafka/IoT Core.
@@ -129,12 +252,36 @@ Device Telemetry Platforms
 - The DiagnosticAgent and VerificationAgent are the natural extension points:
   replace the mocked checks with real API calls and business rules.
 
+- Workflow types are registered in app/workflows.py (diagnose / act / verify /
+  escalate / summary handlers and retry limits). A new scenario is a
+  WorkflowType member plus one registration; agents dispatch through the
+  compiled registry instead of branching per type.
+
+- Root-cause and remediation rules live in app/decision_tables.py as data.
+  Point DECISION_RULES_PATH at a JSON copy of DEFAULT_RULES and call
+  /reload-decision-tables to change them without a deploy.
+
+Traffic Record & Replay
+-----------------------
+- Set TRAFFIC_RECORD_DIR to capture every /trigger-workflow and
+  /simulate-telemetry call (plus each workflow's final outcome) into rotating
+  gzip JSON-lines segments.
+- `python -m app.replay <dir> --speed 1|N|max` feeds a recording into a fresh
+  WorkflowEngine and reports throughput, latency and outcome differences.
+
 CRM / Ticketing Systems (ServiceNow, Zendesk, Salesforce)
 ---------------------------------------------------------
-- When EscalationDecisionAgent marks a workflow as escalated, you can:
-  - Create or update a ticket with the full WorkflowState payload.
-  - Attach state.logs as a structured diagnostic trace.
-  - Use workflow_id as an external reference ID to correlate events.
+- When EscalationDecisionAgent marks a workflow as escalated, the engine
+  enqueues it in the EscalationOutbox (app/escalation_outbox.py). The
+  EscalationDispatcher then, in the background:
+  - Creates tickets in batches per target_queue with the full WorkflowState payload.
+  - Attaches state.logs gzip-compressed as a structured diagnostic trace.
+  - Uses workflow_id as an external reference ID (and deduplication key).
+  - Retries failed batches with exponential backoff.
+
+- Set TICKETING_URL to POST batches to a real endpoint (or to the stub in
+  app/ticketing_stub.py); set ESCALATION_OUTBOX_PATH to journal the outbox
+  to disk so undelivered tickets survive restarts.
 
 - The /get-workflow-status endpoint can be used by downstream systems to
   poll or subscribe for changes to workflow outcomes.
@@ -26,6 +26,7 @@ class WorkflowStage(str, Enum):
     escalated = "escalated"
     completed = "completed"
     failed = "failed"
+    cancelled = "cancelled"
 
 
 class WorkflowStatus(str, Enum):
@@ -34,6 +35,8 @@ class WorkflowStatus(str, Enum):
     completed = "completed"
     escalated = "escalated"
     failed = "failed"
+    cancelled = "cancelled"
+    timed_out = "timed_out"
 
 
 class CustomerInteraction(BaseModel):
@@ -123,6 +126,7 @@ class WorkflowState(BaseModel):
     resolution_reason: Optional[str] = None
     created_at: datetime = Field(default_factory=datetime.utcnow)
     updated_at: datetime = Field(default_factory=datetime.utcnow)
+    deadline_at: Optional[datetime] = None
     logs: List[WorkflowLogEntry] = []
 
 
@@ -143,3 +147,6 @@ class SimulateTelemetryRequest(BaseModel):
     telemetry: TelemetrySnapshot
 
 
+class CancelWorkflowRequest(BaseModel):
+    workflow_id: str
+    reason: Optional[str] = Field(None, description="Why the run was cancelled, e.g. 'resolved by human agent'.")
@@ -0,0 +1,105 @@
+from __future__ import annotations
+
+import logging
+from dataclasses import dataclass
+from types import MappingProxyType
+from typing import TYPE_CHECKING, Any, Awaitable, Callable, Dict, List, Mapping, Optional, Tuple
+
+from .models import EscalationInfo, VerificationResult, WorkflowState, WorkflowType
+
+if TYPE_CHECKING:
+    from .agents import WorkflowContext
+
+logger = logging.getLogger("agentic_support.registry")
+
+DiagnoseHandler = Callable[["WorkflowContext", WorkflowState], Awaitable[Dict[str, Any]]]
+ActHandler = Callable[["WorkflowContext", WorkflowState], Awaitable[None]]
+VerifyHandler = Callable[["WorkflowContext", WorkflowState], Awaitable[VerificationResult]]
+EscalateHandler = Callable[["WorkflowContext", WorkflowState], Optional[EscalationInfo]]
+SummaryHandler = Callable[[WorkflowState], str]
+
+
+@dataclass(frozen=True)
+class WorkflowDefinition:
+    """
+    Everything the engine and agents need to run one workflow type.
+
+    - diagnose: returns the diagnosis dict, stored under
+      state.diagnosis[workflow_type]; "root_cause" is filled in from the
+      decision tables unless the handler sets it
+    - act: optional; when omitted the remediation planned by the decision
+      tables for the diagnosed root cause is executed
+    - verify: checks whether the remediation worked
+    - escalate: called only when verification failed; returns the escalation
+      to raise, or None to close without escalating
+    - summary: base sentence for the case summary
+    - max_attempts: automated remediation attempts before giving up
+    - stage_timeout_seconds: deadline for any single stage (diagnose, act, ...)
+    - intent_keywords: phrases that map a customer interaction to this type
+    """
+
+    workflow_type: WorkflowType
+    diagnose: DiagnoseHandler
+    verify: VerifyHandler
+    escalate: EscalateHandler
+    summary: SummaryHandler
+    act: Optional[ActHandler] = None
+    max_attempts: int = 1
+    stage_timeout_seconds: float = 30.0
+    intent_keywords: Tuple[str, ...] = ()
+
+
+class WorkflowRegistry:
+    """
+    Registry of workflow definitions, compiled into a read-only dispatch table.
+
+    Agents dispatch with a single dict lookup per stage, so the cost of
+    routing stays constant as workflow types are added. Adding a scenario is
+    a WorkflowType member plus one ``register`` call.
+    """
+
+    def __init__(self) -> None:
+        self._definitions: Dict[WorkflowType, WorkflowDefinition] = {}
+        self._table: Mapping[WorkflowType, WorkflowDefinition] = MappingProxyType({})
+        self._intents: Tuple[Tuple[str, WorkflowType], ...] = ()
+        self._compiled = False
+
+    def register(self, definition: WorkflowDefinition) -> WorkflowDefinition:
+        if self._compiled:
+            raise RuntimeError("Workflow registry is already compiled; register workflows at import time")
+        if definition.workflow_type in self._definitions:
+            raise ValueError(f"Workflow type {definition.workflow_type.value} is already registered")
+        self._definitions[definition.workflow_type] = definition
+        return definition
+
+    def compile(self) -> None:
+        """Freeze registrations into the dispatch table. Safe to call more than once."""
+        if self._compiled:
+            return
+        missing = [wt.value for wt in WorkflowType if wt not in self._definitions]
+        if missing:
+            logger.warning("Workflow types without a registered definition: %s", ", ".join(missing))
+
+        self._table = MappingProxyType(dict(self._definitions))
+        # Registration order decides precedence between overlapping keywords
+        self._intents = tuple(
+            (keyword, d.workflow_type) for d in self._definitions.values() for keyword in d.intent_keywords
+        )
+        self._compiled = True
+
+    def get(self, workflow_type: WorkflowType) -> Optional[WorkflowDefinition]:
+        if not self._compiled:
+            self.compile()
+        return self._table.get(workflow_type)
+
+    def match_intent(self, text: str) -> Optional[WorkflowType]:
+        if not self._compiled:
+            self.compile()
+        return next((wt for keyword, wt in self._intents if keyword in text), None)
+
+    def workflow_types(self) -> List[WorkflowType]:
+        return list(self._definitions)
+
+
+# Shared registry; built-in workflows register themselves in app/workflows.py
+workflow_registry = WorkflowRegistry()
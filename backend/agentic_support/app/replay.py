@@ -0,0 +1,140 @@
+"""
+Replay recorded traffic into a fresh WorkflowEngine.
+
+Record with TRAFFIC_RECORD_DIR=/path/to/dir set on the API, then run:
+
+    python -m app.replay /path/to/dir --speed 1     # real time
+    python -m app.replay /path/to/dir --speed 20    # 20x faster
+    python -m app.replay /path/to/dir --speed max   # as fast as possible
+
+The report covers throughput, trigger-to-completion latency and every workflow
+whose final outcome differs from the one observed when it was recorded.
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import json
+import time
+from typing import Any, Dict, List, Optional, Set
+
+from .analytics import QuantileSketch
+from .engine import WorkflowEngine
+from .models import SimulateTelemetryRequest, WorkflowState, WorkflowTriggerRequest
+from .telemetry_history import TelemetryHistory
+from .telemetry_ingest import TelemetryStore
+from .traffic_recorder import outcome_of, read_recording
+
+
+async def replay(path: str, speed: Optional[float] = 1.0, max_diffs: int = 50) -> Dict[str, Any]:
+    """
+    Feed a recording into a new engine. ``speed=None`` replays as fast as possible.
+    """
+    # Replayed telemetry feeds a private history that the engine diagnoses from,
+    # so trend-based rules see the recorded traffic and nothing leaks in from
+    # (or out to) the process-wide history. Its clock follows the recording,
+    # so history windows end where they did when the traffic was captured.
+    clock = {"t": 0.0}
+    history = TelemetryHistory(clock=lambda: clock["t"])
+    # An in-memory outbox and no recorder: never deliver tickets, touch the
+    # production journal or re-record traffic while replaying
+    engine = WorkflowEngine(history=history)
+    telemetry_store = TelemetryStore(history=history)
+
+    latency = QuantileSketch()
+    diffs: List[Dict[str, Any]] = []
+    diff_count = 0
+    compared = 0
+    # Outcomes seen on one side only, until the other side arrives. A recorded
+    # outcome follows its trigger in the stream, so both stay small.
+    recorded_outcomes: Dict[str, Dict[str, Any]] = {}
+    replayed_outcomes: Dict[str, Dict[str, Any]] = {}
+
+    def compare(workflow_id: str, expected: Dict[str, Any], actual: Dict[str, Any]) -> None:
+        nonlocal diff_count, compared
+        compared += 1
+        changed = {k: {"recorded": expected.get(k), "replayed": v} for k, v in actual.items() if expected.get(k) != v}
+        if changed:
+            diff_count += 1
+            if len(diffs) < max_diffs:
+                diffs.append({"workflow_id": workflow_id, "changes": changed})
+
+    async def run_trigger(workflow_id: str, state: WorkflowState, started: float) -> None:
+        final = await engine.wait(state.id)
+        latency.add(time.perf_counter() - started)
+        expected = recorded_outcomes.pop(workflow_id, None)
+        if expected is None:
+            replayed_outcomes[workflow_id] = outcome_of(final)
+        else:
+            compare(workflow_id, expected, outcome_of(final))
+
+    start = time.perf_counter()
+    first_ts: Optional[float] = None
+    runs: Set[asyncio.Task] = set()
+    workflows = 0
+    events = 0
+    # Segments are written in time order, so the recording is streamed rather
+    # than loaded and sorted
+    for record in read_recording(path):
+        if record["kind"] == "outcome":
+            actual = replayed_outcomes.pop(record["workflow_id"], None)
+            if actual is None:
+                recorded_outcomes[record["workflow_id"]] = record["outcome"]
+            else:
+                compare(record["workflow_id"], record["outcome"], actual)
+            continue
+
+        events += 1
+        if first_ts is None:
+            first_ts = record["t"]
+        if speed:
+            delay = (record["t"] - first_ts) / speed - (time.perf_counter() - start)
+            if delay > 0:
+                await asyncio.sleep(delay)
+        clock["t"] = record["t"]
+        if record["kind"] == "trigger":
+            # Trigger in event order so the run sees exactly the telemetry
+            # recorded before it; only the wait for completion runs concurrently
+            started = time.perf_counter()
+            state = await engine.trigger(WorkflowTriggerRequest.model_validate(record["payload"]))
+            task = asyncio.create_task(run_trigger(record["workflow_id"], state, started))
+            runs.add(task)
+            task.add_done_callback(runs.discard)
+            workflows += 1
+        else:
+            payload = SimulateTelemetryRequest.model_validate(record["payload"])
+            telemetry_store.apply(payload.device_id, payload.telemetry.model_dump(), replace=True)
+    await asyncio.gather(*runs)
+    elapsed = time.perf_counter() - start
+
+    return {
+        "events": events,
+        "workflows": workflows,
+        "telemetry_updates": events - workflows,
+        "elapsed_seconds": round(elapsed, 3),
+        "throughput_workflows_per_second": round(workflows / elapsed, 2) if elapsed else None,
+        "latency_seconds": latency.summary(),
+        "outcomes": {
+            "compared": compared,
+            "without_recorded_outcome": len(replayed_outcomes),
+            "differing": diff_count,
+            "diffs": diffs,
+        },
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Replay recorded traffic into a fresh WorkflowEngine")
+    parser.add_argument("recording", help="Recording directory or a single segment file")
+    parser.add_argument("--speed", default="1", help="Replay speed multiplier, or 'max' for no pacing")
+    parser.add_argument("--max-diffs", type=int, default=50, help="Maximum differing workflows to list")
+    args = parser.parse_args()
+
+    speed = None if args.speed == "max" else float(args.speed)
+    report = asyncio.run(replay(args.recording, speed=speed, max_diffs=args.max_diffs))
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
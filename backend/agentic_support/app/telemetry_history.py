@@ -0,0 +1,300 @@
+from __future__ import annotations
+
+import time
+from array import array
+from typing import Any, Callable, Dict, List, Optional, Set
+
+INK_COLORS = ("cyan", "magenta", "yellow", "black")
+_UNKNOWN = -1
+
+
+class ErrorCodeTable:
+    """Interns error-code strings to small integer ids (0 means "no error")."""
+
+    def __init__(self) -> None:
+        self._ids: Dict[str, int] = {}
+        self._codes: List[str] = [""]
+
+    def id_for(self, code: Optional[str]) -> int:
+        if not code:
+            return 0
+        code_id = self._ids.get(code)
+        if code_id is None:
+            if len(self._codes) >= 0xFFFF:
+                return 0
+            code_id = self._ids[code] = len(self._codes)
+            self._codes.append(code)
+        return code_id
+
+    def code_for(self, code_id: int) -> Optional[str]:
+        return self._codes[code_id] if code_id else None
+
+
+def _tri(value: Optional[bool]) -> int:
+    return _UNKNOWN if value is None else int(bool(value))
+
+
+class DeviceHistory:
+    """
+    Fixed-size telemetry history for one device, stored in packed typed arrays.
+
+    The newest ``raw_capacity`` samples are kept as-is in a ring buffer
+    (timestamp, online flag, four ink levels and the ids of up to
+    ``error_slots`` error codes; further codes in the same sample are not
+    kept). When a raw
+    sample is overwritten it is folded into a coarse tier of ``bucket_seconds``
+    wide buckets (sample / online / flap counts, minimum ink levels, largest
+    heartbeat gap), itself a ring of ``bucket_capacity`` entries. Memory per
+    device is therefore constant, and window queries touch only the samples
+    and buckets inside the window.
+    """
+
+    def __init__(self, codes: ErrorCodeTable, raw_capacity: int = 128, bucket_capacity: int = 48,
+                 bucket_seconds: int = 3600, clock: Callable[[], float] = time.time,
+                 error_slots: int = 3) -> None:
+        self._codes = codes
+        self._clock = clock
+        self._raw_capacity = raw_capacity
+        self._bucket_capacity = bucket_capacity
+        self._bucket_seconds = bucket_seconds
+
+        # Raw tier
+        self._ts = array("d", bytes(8 * raw_capacity))
+        self._online = array("b", bytes(raw_capacity))
+        self._ink = [array("b", bytes(raw_capacity)) for _ in INK_COLORS]
+        self._errors = [array("H", bytes(2 * raw_capacity)) for _ in range(error_slots)]
+        self._head = 0  # next write position
+        self._size = 0
+
+        # Coarse tier
+        self._b_start = array("d", bytes(8 * bucket_capacity))
+        self._b_samples = array("H", bytes(2 * bucket_capacity))
+        self._b_online = array("H", bytes(2 * bucket_capacity))
+        self._b_flaps = array("H", bytes(2 * bucket_capacity))
+        self._b_ink_min = [array("b", bytes(bucket_capacity)) for _ in INK_COLORS]
+        self._b_max_gap = array("f", bytes(4 * bucket_capacity))
+        self._b_head = 0
+        self._b_size = 0
+
+        # Newest sample folded into the coarse tier, to keep flap and gap
+        # accounting continuous across the tier boundary
+        self._folded_ts: Optional[float] = None
+        self._folded_online = _UNKNOWN
+
+    # -- writes -------------------------------------------------------------
+
+    def append(self, ts: float, online: Optional[bool], ink_levels: Dict[str, Optional[int]],
+               error_codes: List[str]) -> None:
+        if self._size:
+            # Keep the ring ordered even if a clock goes backwards
+            ts = max(ts, self._ts[(self._head - 1) % self._raw_capacity])
+
+        i = self._head
+        if self._size == self._raw_capacity:
+            self._fold(i)
+        else:
+            self._size += 1
+
+        self._ts[i] = ts
+        self._online[i] = _tri(online)
+        for column, color in zip(self._ink, INK_COLORS):
+            level = ink_levels.get(color)
+            column[i] = _UNKNOWN if level is None else max(0, min(100, int(level)))
+        for slot, column in enumerate(self._errors):
+            column[i] = self._codes.id_for(error_codes[slot] if slot < len(error_codes) else None)
+        self._head = (i + 1) % self._raw_capacity
+
+    def _fold(self, i: int) -> None:
+        ts = self._ts[i]
+        start = ts - ts % self._bucket_seconds
+
+        newest = (self._b_head - 1) % self._bucket_capacity
+        if self._b_size == 0 or self._b_start[newest] != start:
+            b = self._b_head
+            self._b_start[b] = start
+            self._b_samples[b] = self._b_online[b] = self._b_flaps[b] = 0
+            for column in self._b_ink_min:
+                column[b] = _UNKNOWN
+            self._b_max_gap[b] = 0.0
+            self._b_head = (b + 1) % self._bucket_capacity
+            self._b_size = min(self._b_size + 1, self._bucket_capacity)
+        else:
+            b = newest
+
+        online = self._online[i]
+        self._b_samples[b] = min(self._b_samples[b] + 1, 0xFFFF)
+        if online == 1:
+            self._b_online[b] = min(self._b_online[b] + 1, 0xFFFF)
+        if self._folded_online == 1 and online == 0:
+            self._b_flaps[b] = min(self._b_flaps[b] + 1, 0xFFFF)
+        for raw, lowest in zip(self._ink, self._b_ink_min):
+            level = raw[i]
+            if level != _UNKNOWN and (lowest[b] == _UNKNOWN or level < lowest[b]):
+                lowest[b] = level
+        if self._folded_ts is not None:
+            self._b_max_gap[b] = max(self._b_max_gap[b], ts - self._folded_ts)
+
+        self._folded_ts = ts
+        if online != _UNKNOWN:
+            self._folded_online = online
+
+    # -- window helpers -----------------------------------------------------
+
+    def _raw_window(self, since: float) -> List[int]:
+        """Raw-tier indices with ts >= since, oldest first."""
+        indices = []
+        for k in range(1, self._size + 1):
+            i = (self._head - k) % self._raw_capacity
+            if self._ts[i] < since:
+                break
+            indices.append(i)
+        indices.reverse()
+        return indices
+
+    def _bucket_window(self, since: float) -> List[int]:
+        """Coarse-tier indices whose bucket overlaps [since, now], oldest first."""
+        indices = []
+        for k in range(1, self._b_size + 1):
+            b = (self._b_head - k) % self._bucket_capacity
+            if self._b_start[b] + self._bucket_seconds <= since:
+                break
+            indices.append(b)
+        indices.reverse()
+        return indices
+
+    def _since(self, window_seconds: float, now: Optional[float]) -> float:
+        return (self._clock() if now is None else now) - window_seconds
+
+    # -- queries ------------------------------------------------------------
+
+    def flap_count(self, window_seconds: float, now: Optional[float] = None) -> int:
+        """Number of online -> offline transitions within the window."""
+        since = self._since(window_seconds, now)
+        flaps = sum(self._b_flaps[b] for b in self._bucket_window(since))
+
+        window = self._raw_window(since)
+        if not window:
+            return flaps
+        # Transition into the oldest sample in the window counts too
+        if len(window) == self._size:
+            prev = self._folded_online
+        else:
+            prev = self._online[(window[0] - 1) % self._raw_capacity]
+        for i in window:
+            online = self._online[i]
+            if prev == 1 and online == 0:
+                flaps += 1
+            if online != _UNKNOWN:
+                prev = online
+        return flaps
+
+    def max_heartbeat_gap(self, window_seconds: float, now: Optional[float] = None) -> Optional[float]:
+        """Largest interval between consecutive samples within the window, in seconds."""
+        since = self._since(window_seconds, now)
+        gaps = [self._b_max_gap[b] for b in self._bucket_window(since)]
+        window = self._raw_window(since)
+        ts = [self._ts[i] for i in window]
+        if ts and len(window) == self._size and self._folded_ts is not None:
+            ts.insert(0, self._folded_ts)
+        gaps.extend(b - a for a, b in zip(ts, ts[1:]))
+        return max(gaps) if gaps else None
+
+    def ink_depletion_rate(self, color: str, window_seconds: float, now: Optional[float] = None) -> Optional[float]:
+        """
+        Ink consumed per hour over the window (least-squares slope, positive
+        when the level is falling). Coarse buckets contribute their minimum
+        level at the bucket midpoint. None if fewer than two known points.
+        """
+        since = self._since(window_seconds, now)
+        c = INK_COLORS.index(color)
+        points = [
+            (self._b_start[b] + self._bucket_seconds / 2, self._b_ink_min[c][b])
+            for b in self._bucket_window(since)
+            if self._b_ink_min[c][b] != _UNKNOWN
+        ]
+        raw = self._ink[c]
+        points.extend((self._ts[i], raw[i]) for i in self._raw_window(since) if raw[i] != _UNKNOWN)
+        if len(points) < 2:
+            return None
+
+        n = len(points)
+        mean_t = sum(t for t, _ in points) / n
+        mean_v = sum(v for _, v in points) / n
+        var_t = sum((t - mean_t) ** 2 for t, _ in points)
+        if var_t == 0:
+            return None
+        slope = sum((t - mean_t) * (v - mean_v) for t, v in points) / var_t
+        return round(-slope * 3600, 4)
+
+    def recent_error_codes(self, window_seconds: float, now: Optional[float] = None) -> Set[str]:
+        since = self._since(window_seconds, now)
+        return {
+            self._codes.code_for(column[i])
+            for i in self._raw_window(since)
+            for column in self._errors
+            if column[i]
+        }
+
+    def trend(self, window_seconds: float = 86400, now: Optional[float] = None) -> Dict[str, Any]:
+        """Summary of the window for diagnostics and logs."""
+        return {
+            "window_seconds": window_seconds,
+            "flap_count": self.flap_count(window_seconds, now),
+            "max_heartbeat_gap_seconds": self.max_heartbeat_gap(window_seconds, now),
+            "ink_depletion_per_hour": {
+                color: self.ink_depletion_rate(color, window_seconds, now) for color in INK_COLORS
+            },
+        }
+
+    def nbytes(self) -> int:
+        """Bytes held by the packed arrays (constant per device)."""
+        columns = [self._ts, self._online, *self._errors, *self._ink, self._b_start, self._b_samples,
+                   self._b_online, self._b_flaps, self._b_max_gap, *self._b_ink_min]
+        return sum(col.itemsize * len(col) for col in columns)
+
+
+class TelemetryHistory:
+    """
+    Per-device telemetry histories for the fleet, sharing one error-code table.
+
+    ``clock`` stamps samples that carry no heartbeat and ends query windows
+    that are not given an explicit ``now``; replays pass the recording's clock
+    so windows line up with the recorded heartbeats.
+    """
+
+    def __init__(self, raw_capacity: int = 128, bucket_capacity: int = 48, bucket_seconds: int = 3600,
+                 clock: Callable[[], float] = time.time) -> None:
+        self._codes = ErrorCodeTable()
+        self._clock = clock
+        self._devices: Dict[str, DeviceHistory] = {}
+        self._raw_capacity = raw_capacity
+        self._bucket_capacity = bucket_capacity
+        self._bucket_seconds = bucket_seconds
+
+    def record(self, device_id: str, telemetry: Dict[str, Any], ts: Optional[float] = None) -> None:
+        """Append a sample from a telemetry dict (TelemetrySnapshot field names)."""
+        history = self._devices.get(device_id)
+        if history is None:
+            history = self._devices[device_id] = DeviceHistory(
+                self._codes, self._raw_capacity, self._bucket_capacity, self._bucket_seconds, self._clock
+            )
+        history.append(
+            self._clock() if ts is None else ts,
+            telemetry.get("online"),
+            {color: telemetry.get(f"ink_level_{color}") for color in INK_COLORS},
+            telemetry.get("error_codes") or [],
+        )
+
+    def now(self) -> float:
+        """Current time on this history's clock (epoch seconds)."""
+        return self._clock()
+
+    def get(self, device_id: str) -> Optional[DeviceHistory]:
+        return self._devices.get(device_id)
+
+    def __len__(self) -> int:
+        return len(self._devices)
+
+
+# Shared fleet history fed by the telemetry store and read by diagnostics
+telemetry_history = TelemetryHistory()
@@ -0,0 +1,421 @@
+from __future__ import annotations
+
+import asyncio
+import json
+import math
+import struct
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from typing import Any, AsyncIterable, Dict, Iterable, Iterator, List, Optional, Tuple
+
+from .telemetry_history import TelemetryHistory
+
+# Field order used by the compact per-device record and the binary batch format.
+TELEMETRY_FIELDS: Tuple[str, ...] = (
+    "online",
+    "last_heartbeat_ts",
+    "error_codes",
+    "ink_level_cyan",
+    "ink_level_magenta",
+    "ink_level_yellow",
+    "ink_level_black",
+    "spooler_healthy",
+    "network_reachable",
+)
+_FIELD_INDEX = {name: i for i, name in enumerate(TELEMETRY_FIELDS)}
+_HEARTBEAT = _FIELD_INDEX["last_heartbeat_ts"]
+_ERROR_CODES = _FIELD_INDEX["error_codes"]
+_EMPTY_RECORD: Tuple[Any, ...] = tuple(() if name == "error_codes" else None for name in TELEMETRY_FIELDS)
+
+NDJSON_CONTENT_TYPE = "application/x-ndjson"
+BATCH_CONTENT_TYPE = "application/x-telemetry-batch"
+
+
+class TelemetryFormatError(ValueError):
+    """Raised when an ingest body cannot be decoded."""
+
+
+def _valid_fields(fields: Any) -> bool:
+    """Cheap type check of a decoded telemetry row against the TelemetrySnapshot field types."""
+    if not isinstance(fields, dict):
+        return False
+    for name, value in fields.items():
+        if value is None or name not in _FIELD_INDEX:
+            continue
+        if name in ("online", "spooler_healthy", "network_reachable"):
+            if not isinstance(value, bool):
+                return False
+        elif name == "last_heartbeat_ts":
+            if isinstance(value, bool) or not isinstance(value, (int, float, str)):
+                return False
+        elif name == "error_codes":
+            if not isinstance(value, list) or not all(isinstance(code, str) for code in value):
+                return False
+        elif isinstance(value, bool) or not isinstance(value, int) or not 0 <= value <= 100:
+            # ink levels
+            return False
+    return True
+
+
+def _to_epoch(value: Any) -> Optional[float]:
+    """Normalize a heartbeat (datetime, ISO string or epoch seconds) to UTC epoch seconds."""
+    if value is None:
+        return None
+    if isinstance(value, (int, float)):
+        return float(value)
+    if isinstance(value, str):
+        value = datetime.fromisoformat(value)
+    if isinstance(value, datetime):
+        if value.tzinfo is None:
+            # Timestamps in this service are naive UTC (datetime.utcnow)
+            value = value.replace(tzinfo=timezone.utc)
+        return value.timestamp()
+    raise TelemetryFormatError(f"Invalid last_heartbeat_ts: {value!r}")
+
+
+@dataclass
+class IngestStats:
+    received: int = 0
+    applied: int = 0
+    unchanged: int = 0
+    stale: int = 0
+    errors: int = 0
+
+    def as_dict(self) -> Dict[str, int]:
+        return {
+            "received": self.received,
+            "applied": self.applied,
+            "unchanged": self.unchanged,
+            "stale": self.stale,
+            "errors": self.errors,
+        }
+
+
+class TelemetryStore:
+    """
+    Latest telemetry per device with last-write-wins semantics.
+
+    Each device is stored as a flat tuple in TELEMETRY_FIELDS order (heartbeat
+    as epoch seconds, error codes as an interned tuple) rather than a dict or
+    pydantic model, to keep memory per device small. Updates older than the
+    stored heartbeat are dropped. Updates without a heartbeat are accepted in
+    arrival order (simple pushers and /simulate-telemetry often omit it) but
+    never clear a known heartbeat, so later timestamped updates are still
+    ordered against it. Accepted updates publish only the fields that
+    actually changed to subscribers and, if a history is attached, append a
+    sample to the device's trend history.
+    """
+
+    def __init__(self, subscriber_queue_size: int = 10_000, history: Optional[TelemetryHistory] = None) -> None:
+        self.history = history
+        self._records: Dict[str, Tuple[Any, ...]] = {}
+        self._subscribers: List[asyncio.Queue] = []
+        self._queue_size = subscriber_queue_size
+        self._codes: Dict[str, str] = {}
+        self.dropped_deltas = 0
+
+    def subscribe(self) -> asyncio.Queue:
+        """Return a queue receiving ``{"device_id", "changed"}`` deltas."""
+        queue: asyncio.Queue = asyncio.Queue(maxsize=self._queue_size)
+        self._subscribers.append(queue)
+        return queue
+
+    def unsubscribe(self, queue: asyncio.Queue) -> None:
+        if queue in self._subscribers:
+            self._subscribers.remove(queue)
+
+    def apply(self, device_id: str, fields: Dict[str, Any], replace: bool = False) -> Tuple[str, Dict[str, Any]]:
+        """
+        Apply an update for one device.
+
+        Only keys present in ``fields`` are updated unless ``replace`` is set, in
+        which case missing fields are reset. Returns ``(outcome, changed_fields)``
+        where outcome is one of "applied", "unchanged" or "stale".
+        """
+        current = self._records.get(device_id, _EMPTY_RECORD)
+        incoming_ts = _to_epoch(fields.get("last_heartbeat_ts"))
+        current_ts = current[_HEARTBEAT]
+        if incoming_ts is not None and current_ts is not None and incoming_ts < current_ts:
+            return "stale", {}
+
+        new = list(_EMPTY_RECORD if replace else current)
+        new[_HEARTBEAT] = current_ts if incoming_ts is None else incoming_ts
+        for name, value in fields.items():
+            idx = _FIELD_INDEX.get(name)
+            if idx is None:
+                continue
+            if idx == _HEARTBEAT:
+                continue
+            elif idx == _ERROR_CODES:
+                value = tuple(self._codes.setdefault(c, c) for c in (value or ()))
+            new[idx] = value
+
+        changed = {
+            TELEMETRY_FIELDS[i]: self._export_value(i, new[i])
+            for i in range(len(TELEMETRY_FIELDS))
+            if new[i] != current[i]
+        }
+        if not changed:
+            return "unchanged", {}
+
+        # Only store the record once every side effect that can fail has succeeded
+        if self.history is not None:
+            self.history.record(device_id, dict(zip(TELEMETRY_FIELDS, new)), ts=new[_HEARTBEAT])
+        self._records[device_id] = tuple(new)
+        self._publish({"device_id": device_id, "changed": changed})
+        return "applied", changed
+
+    def _publish(self, delta: Dict[str, Any]) -> None:
+        for queue in self._subscribers:
+            try:
+                queue.put_nowait(delta)
+            except asyncio.QueueFull:
+                self.dropped_deltas += 1
+
+    @staticmethod
+    def _export_value(idx: int, value: Any) -> Any:
+        if idx == _HEARTBEAT and value is not None:
+            return datetime.fromtimestamp(value, tz=timezone.utc).replace(tzinfo=None)
+        if idx == _ERROR_CODES:
+            return list(value)
+        return value
+
+    def get(self, device_id: str) -> Optional[Dict[str, Any]]:
+        record = self._records.get(device_id)
+        if record is None:
+            return None
+        return {name: self._export_value(i, record[i]) for i, name in enumerate(TELEMETRY_FIELDS)}
+
+    def __len__(self) -> int:
+        return len(self._records)
+
+
+# ---------------------------------------------------------------------------
+# NDJSON
+# ---------------------------------------------------------------------------
+
+
+class NdjsonDecoder:
+    """
+    Incremental NDJSON decoder. Each line is either
+    ``{"device_id": ..., "telemetry": {...}}`` (the /simulate-telemetry shape)
+    or a flat object with ``device_id`` next to the telemetry fields. Rows whose
+    fields do not match the TelemetrySnapshot types are rejected.
+    """
+
+    def __init__(self, max_line_bytes: int = 64 * 1024) -> None:
+        self._buffer = b""
+        self._max_line = max_line_bytes
+        # Malformed lines are skipped and counted rather than aborting the stream
+        self.errors = 0
+
+    def feed(self, chunk: bytes) -> Iterator[Tuple[str, Dict[str, Any]]]:
+        self._buffer += chunk
+        *lines, self._buffer = self._buffer.split(b"\n")
+        if len(self._buffer) > self._max_line:
+            raise TelemetryFormatError("NDJSON line exceeds maximum length")
+        for line in lines:
+            yield from self._decode(line)
+
+    def finish(self) -> Iterator[Tuple[str, Dict[str, Any]]]:
+        line, self._buffer = self._buffer, b""
+        yield from self._decode(line)
+
+    def _decode(self, line: bytes) -> Iterator[Tuple[str, Dict[str, Any]]]:
+        line = line.strip()
+        if not line:
+            return
+        try:
+            obj = json.loads(line)
+            device_id = obj.pop("device_id")
+            fields = obj.get("telemetry", obj)
+        except (ValueError, KeyError, AttributeError, TypeError):
+            self.errors += 1
+            return
+        if device_id is None or not _valid_fields(fields):
+            self.errors += 1
+            return
+        yield str(device_id), fields
+
+
+# ---------------------------------------------------------------------------
+# Binary columnar batch format
+# ---------------------------------------------------------------------------
+#
+# A body is a sequence of frames, each prefixed with its length (u32, little
+# endian), so a stream can be decoded one frame at a time. A frame holds one
+# batch of rows laid out column by column:
+#
+#   magic      4s   b"TLB1"
+#   rows       u32
+#   codes      u16  size of the error-code string table, followed by
+#                   (u16 length + utf-8 bytes) per code
+#   device_id  per row: u16 length + utf-8 bytes
+#   heartbeat  rows x f64 epoch seconds (NaN = unknown)
+#   flags      rows x u8; bits 0-1 online, 2-3 spooler_healthy,
+#              4-5 network_reachable (low bit = known, high bit = value)
+#   ink        4 columns (c, m, y, k) of rows x i8 (-1 = unknown)
+#   errors     per row: u8 count + count x u16 code-table index
+
+_MAGIC = b"TLB1"
+_FLAG_FIELDS = ("online", "spooler_healthy", "network_reachable")
+_INK_FIELDS = ("ink_level_cyan", "ink_level_magenta", "ink_level_yellow", "ink_level_black")
+
+
+def encode_batch(rows: Iterable[Tuple[str, Dict[str, Any]]]) -> bytes:
+    """Encode ``(device_id, telemetry)`` rows into a single length-prefixed frame."""
+    rows = list(rows)
+    code_table: Dict[str, int] = {}
+    for _, t in rows:
+        for code in t.get("error_codes") or ():
+            code_table.setdefault(code, len(code_table))
+
+    parts = [_MAGIC, struct.pack("<IH", len(rows), len(code_table))]
+    for code in code_table:
+        raw = code.encode("utf-8")
+        parts.append(struct.pack("<H", len(raw)) + raw)
+    for device_id, _ in rows:
+        raw = device_id.encode("utf-8")
+        parts.append(struct.pack("<H", len(raw)) + raw)
+
+    heartbeats = [_to_epoch(t.get("last_heartbeat_ts")) for _, t in rows]
+    parts.append(struct.pack(f"<{len(rows)}d", *(math.nan if h is None else h for h in heartbeats)))
+
+    flags = bytearray()
+    for _, t in rows:
+        byte = 0
+        for shift, name in enumerate(_FLAG_FIELDS):
+            value = t.get(name)
+            if value is not None:
+                byte |= (1 | (2 if value else 0)) << (shift * 2)
+        flags.append(byte)
+    parts.append(bytes(flags))
+
+    for name in _INK_FIELDS:
+        parts.append(struct.pack(f"<{len(rows)}b", *(-1 if t.get(name) is None else t[name] for _, t in rows)))
+
+    for _, t in rows:
+        codes = t.get("error_codes") or ()
+        parts.append(struct.pack(f"<B{len(codes)}H", len(codes), *(code_table[c] for c in codes)))
+
+    frame = b"".join(parts)
+    return struct.pack("<I", len(frame)) + frame
+
+
+class BatchFrameDecoder:
+    """Incremental decoder for the binary batch format; buffers at most one frame."""
+
+    def __init__(self, max_frame_bytes: int = 16 * 1024 * 1024) -> None:
+        self._buffer = bytearray()
+        self._max_frame = max_frame_bytes
+        self.errors = 0
+
+    def feed(self, chunk: bytes) -> Iterator[Tuple[str, Dict[str, Any]]]:
+        self._buffer += chunk
+        while len(self._buffer) >= 4:
+            (size,) = struct.unpack_from("<I", self._buffer)
+            if size > self._max_frame:
+                raise TelemetryFormatError("Batch frame exceeds maximum size")
+            if len(self._buffer) < 4 + size:
+                break
+            frame = bytes(self._buffer[4 : 4 + size])
+            del self._buffer[: 4 + size]
+            yield from self._decode_frame(frame)
+
+    def finish(self) -> Iterator[Tuple[str, Dict[str, Any]]]:
+        if self._buffer:
+            raise TelemetryFormatError("Truncated batch frame")
+        return iter(())
+
+    @staticmethod
+    def _decode_frame(frame: bytes) -> Iterator[Tuple[str, Dict[str, Any]]]:
+        try:
+            if frame[:4] != _MAGIC:
+                raise TelemetryFormatError("Bad batch frame magic")
+            rows, n_codes = struct.unpack_from("<IH", frame, 4)
+            offset = 10
+
+            def read_str() -> str:
+                nonlocal offset
+                (length,) = struct.unpack_from("<H", frame, offset)
+                offset += 2
+                value = frame[offset : offset + length].decode("utf-8")
+                offset += length
+                return value
+
+            codes = [read_str() for _ in range(n_codes)]
+            device_ids = [read_str() for _ in range(rows)]
+
+            heartbeats = struct.unpack_from(f"<{rows}d", frame, offset)
+            offset += 8 * rows
+            flags = frame[offset : offset + rows]
+            offset += rows
+            inks = []
+            for _ in _INK_FIELDS:
+                inks.append(struct.unpack_from(f"<{rows}b", frame, offset))
+                offset += rows
+
+            for i, device_id in enumerate(device_ids):
+                (count,) = struct.unpack_from("<B", frame, offset)
+                indices = struct.unpack_from(f"<{count}H", frame, offset + 1)
+                offset += 1 + 2 * count
+
+                # Unknown columns are left out so they do not overwrite stored values
+                t: Dict[str, Any] = {"error_codes": [codes[j] for j in indices]}
+                if not math.isnan(heartbeats[i]):
+                    t["last_heartbeat_ts"] = heartbeats[i]
+                for shift, name in enumerate(_FLAG_FIELDS):
+                    bits = (flags[i] >> (shift * 2)) & 3
+                    if bits & 1:
+                        t[name] = bool(bits & 2)
+                for name, column in zip(_INK_FIELDS, inks):
+                    if column[i] >= 0:
+                        t[name] = column[i]
+                yield device_id, t
+        except (struct.error, IndexError, UnicodeDecodeError) as exc:
+            raise TelemetryFormatError(f"Corrupt batch frame: {exc}") from exc
+
+
+def decoder_for(content_type: Optional[str]) -> Any:
+    media_type = (content_type or NDJSON_CONTENT_TYPE).split(";")[0].strip().lower()
+    if media_type == BATCH_CONTENT_TYPE:
+        return BatchFrameDecoder()
+    if media_type in (NDJSON_CONTENT_TYPE, "application/jsonl", "application/json-seq", "text/plain"):
+        return NdjsonDecoder()
+    raise TelemetryFormatError(f"Unsupported content type: {media_type}")
+
+
+async def ingest_stream(
+    store: TelemetryStore,
+    chunks: AsyncIterable[bytes],
+    content_type: Optional[str],
+    yield_every: int = 1000,
+) -> IngestStats:
+    """
+    Decode a streaming body chunk by chunk and apply each record to the store.
+
+    Periodically yields to the event loop so a large upload does not starve
+    workflow orchestration running on the same loop.
+    """
+    decoder = decoder_for(content_type)
+    stats = IngestStats()
+
+    def apply_all(records: Iterable[Tuple[str, Dict[str, Any]]]) -> None:
+        for device_id, fields in records:
+            stats.received += 1
+            try:
+                outcome, _ = store.apply(device_id, fields)
+            except (TelemetryFormatError, ValueError, TypeError):
+                stats.errors += 1
+                continue
+            setattr(stats, outcome, getattr(stats, outcome) + 1)
+
+    next_yield = yield_every
+    async for chunk in chunks:
+        apply_all(decoder.feed(chunk))
+        if stats.received >= next_yield:
+            next_yield = stats.received + yield_every
+            await asyncio.sleep(0)
+    apply_all(decoder.finish())
+    stats.errors += decoder.errors
+    return stats
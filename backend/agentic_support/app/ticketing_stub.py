@@ -0,0 +1,90 @@
+"""
+Local stub ticketing server for exercising the escalation outbox.
+
+Run with:
+
+    python -m app.ticketing_stub --port 8099 --fail-rate 0.2
+
+and start the API with TICKETING_URL=http://127.0.0.1:8099/tickets.
+GET /tickets returns the received tickets grouped by target queue.
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import random
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, List
+
+
+class _StubState:
+    def __init__(self, fail_rate: float) -> None:
+        self.fail_rate = fail_rate
+        self.lock = threading.Lock()
+        self.tickets: Dict[str, List[Dict[str, Any]]] = {}
+        self.batches = 0
+
+
+def make_handler(stub: _StubState) -> type:
+    class Handler(BaseHTTPRequestHandler):
+        def _reply(self, status: int, body: Dict[str, Any]) -> None:
+            data = json.dumps(body).encode("utf-8")
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+        def do_POST(self) -> None:  # noqa: N802 - http.server naming
+            length = int(self.headers.get("Content-Length", 0))
+            batch = json.loads(self.rfile.read(length) or b"{}")
+            if random.random() < stub.fail_rate:
+                self._reply(503, {"error": "simulated outage"})
+                return
+            with stub.lock:
+                stub.batches += 1
+                queue = stub.tickets.setdefault(batch.get("target_queue", "unassigned"), [])
+                queue.extend(batch.get("tickets", []))
+            self._reply(201, {"created": len(batch.get("tickets", []))})
+
+        def do_GET(self) -> None:  # noqa: N802 - http.server naming
+            with stub.lock:
+                summary = {
+                    "batches": stub.batches,
+                    "queues": {
+                        name: [t.get("external_reference") for t in tickets]
+                        for name, tickets in stub.tickets.items()
+                    },
+                }
+            self._reply(200, summary)
+
+        def log_message(self, format: str, *args: Any) -> None:
+            pass
+
+    return Handler
+
+
+def serve(host: str = "127.0.0.1", port: int = 8099, fail_rate: float = 0.0) -> ThreadingHTTPServer:
+    """Create (but do not start) a stub server; call serve_forever() or run it in a thread."""
+    return ThreadingHTTPServer((host, port), make_handler(_StubState(fail_rate)))
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Stub CRM / ticketing server")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8099)
+    parser.add_argument("--fail-rate", type=float, default=0.0, help="Fraction of batches to reject with HTTP 503")
+    args = parser.parse_args()
+
+    server = serve(args.host, args.port, args.fail_rate)
+    print(f"Stub ticketing server listening on http://{args.host}:{args.port}/tickets")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,167 @@
+from __future__ import annotations
+
+import glob
+import gzip
+import json
+import logging
+import os
+import queue
+import threading
+import time
+from datetime import datetime
+from typing import Any, Dict, Iterator, List, Optional
+
+from .models import SimulateTelemetryRequest, WorkflowState, WorkflowTriggerRequest
+
+logger = logging.getLogger("agentic_support.recorder")
+
+SEGMENT_PREFIX = "traffic-"
+SEGMENT_SUFFIX = ".jsonl.gz"
+
+
+def outcome_of(state: WorkflowState) -> Dict[str, Any]:
+    """The parts of a final WorkflowState that replays are compared on."""
+    diag = (state.diagnosis or {}).get(state.workflow_type.value, {})
+    escalation = state.escalation
+    return {
+        "workflow_type": state.workflow_type.value,
+        "status": state.status.value,
+        "stage": state.stage.value,
+        "attempts": state.attempts,
+        "root_cause": diag.get("root_cause") if isinstance(diag, dict) else None,
+        "actions": [a.name for a in state.actions],
+        "escalation_queue": escalation.target_queue if escalation and escalation.required else None,
+    }
+
+
+class TrafficRecorder:
+    """
+    Appends incoming traffic to rotating gzip-compressed JSON-lines segments.
+
+    Each line is ``{"t": <epoch seconds>, "kind": ..., ...}`` where kind is
+    "trigger" (a WorkflowTriggerRequest plus the workflow_id it was assigned),
+    "telemetry" (a /simulate-telemetry payload) or "outcome" (the final
+    outcome of a recorded workflow, used by the replay tool to detect
+    behavior changes). A segment is closed once it reaches ``max_segment_bytes``
+    of uncompressed data; only the newest ``max_segments`` are kept.
+
+    Callers only serialize the record and hand it to a queue; compression,
+    flushing, rotation and old-segment cleanup happen on a background writer
+    thread, so request handlers never block on file I/O. ``close`` drains the
+    queue and closes the current segment.
+    """
+
+    def __init__(
+        self,
+        directory: str,
+        max_segment_bytes: int = 64 * 1024 * 1024,
+        max_segments: int = 48,
+        flush_every: int = 100,
+    ) -> None:
+        self.directory = directory
+        self._max_segment_bytes = max_segment_bytes
+        self._max_segments = max_segments
+        self._flush_every = flush_every
+        self._file: Optional[gzip.GzipFile] = None
+        self._segment_bytes = 0
+        self._pending_flush = 0
+        self._sequence = 0
+        # Each writer thread drains its own queue, so a writer started after
+        # close() never races the previous one for its stop marker
+        self._queue: "queue.SimpleQueue[Optional[bytes]]" = queue.SimpleQueue()
+        self._writer: Optional[threading.Thread] = None
+        self._writer_lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+
+    @classmethod
+    def from_env(cls) -> Optional["TrafficRecorder"]:
+        directory = os.getenv("TRAFFIC_RECORD_DIR")
+        return cls(directory) if directory else None
+
+    def record_trigger(self, req: WorkflowTriggerRequest, workflow_id: str) -> None:
+        self._write({"kind": "trigger", "workflow_id": workflow_id, "payload": req.model_dump(mode="json")})
+
+    def record_telemetry(self, req: SimulateTelemetryRequest) -> None:
+        self._write({"kind": "telemetry", "payload": req.model_dump(mode="json")})
+
+    def record_outcome(self, state: WorkflowState) -> None:
+        self._write({"kind": "outcome", "workflow_id": state.id, "outcome": outcome_of(state)})
+
+    def _write(self, record: Dict[str, Any]) -> None:
+        line = json.dumps({"t": time.time(), **record}, separators=(",", ":")).encode("utf-8") + b"\n"
+        with self._writer_lock:
+            if self._writer is None:
+                self._queue = queue.SimpleQueue()
+                self._writer = threading.Thread(
+                    target=self._run_writer, args=(self._queue,), name="traffic-recorder", daemon=True
+                )
+                self._writer.start()
+            self._queue.put(line)
+
+    def _run_writer(self, lines: "queue.SimpleQueue[Optional[bytes]]") -> None:
+        while True:
+            line = lines.get()
+            if line is None:
+                break
+            try:
+                self._write_line(line)
+            except OSError:
+                logger.exception("Failed to write traffic record to %s", self.directory)
+        self._close_segment()
+
+    def _write_line(self, line: bytes) -> None:
+        if self._file is None or self._segment_bytes + len(line) > self._max_segment_bytes:
+            self._rotate()
+
+        self._file.write(line)
+        self._segment_bytes += len(line)
+        self._pending_flush += 1
+        if self._pending_flush >= self._flush_every:
+            self._file.flush()
+            self._pending_flush = 0
+
+    def _rotate(self) -> None:
+        self._close_segment()
+        self._sequence += 1
+        stamp = datetime.utcnow().strftime("%Y%m%dT%H%M%S")
+        path = os.path.join(self.directory, f"{SEGMENT_PREFIX}{stamp}-{self._sequence:04d}{SEGMENT_SUFFIX}")
+        self._file = gzip.open(path, "ab")
+        self._segment_bytes = 0
+
+        segments = list_segments(self.directory)
+        for old in segments[: max(0, len(segments) - self._max_segments)]:
+            os.remove(old)
+            logger.info("Removed old traffic segment %s", old)
+
+    def _close_segment(self) -> None:
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    def close(self) -> None:
+        """Write out everything queued so far and close the current segment."""
+        # Joined under the lock so no new writer starts while this one drains
+        with self._writer_lock:
+            if self._writer is not None:
+                self._queue.put(None)
+                self._writer.join()
+                self._writer = None
+
+
+def list_segments(directory: str) -> List[str]:
+    """Segments in recording order (names sort chronologically)."""
+    return sorted(glob.glob(os.path.join(directory, f"{SEGMENT_PREFIX}*{SEGMENT_SUFFIX}")))
+
+
+def read_recording(path: str) -> Iterator[Dict[str, Any]]:
+    """Yield records from a segment file or from every segment in a directory."""
+    paths = list_segments(path) if os.path.isdir(path) else [path]
+    for segment in paths:
+        with gzip.open(segment, "rb") as fh:
+            try:
+                for line in fh:
+                    if line.strip():
+                        yield json.loads(line)
+            except (EOFError, gzip.BadGzipFile, ValueError):
+                # The newest segment may be truncated if the process died mid-write
+                logger.warning("Stopped reading truncated segment %s", segment)
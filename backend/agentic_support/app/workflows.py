@@ -0,0 +1,129 @@
+"""
+Built-in workflow definitions.
+
+Each scenario registers its handlers with the shared workflow registry. To add
+a scenario, add a WorkflowType member, register a WorkflowDefinition here and
+(optionally) add its root-cause rules to app/decision_tables.py.
+"""
+
+from __future__ import annotations
+
+from typing import TYPE_CHECKING, Any, Dict, Optional
+
+from .models import EscalationInfo, VerificationResult, WorkflowState, WorkflowType
+from .registry import WorkflowDefinition, workflow_registry
+
+if TYPE_CHECKING:
+    from .agents import WorkflowContext
+
+
+# ---------------------------------------------------------------------------
+# Printer offline
+# ---------------------------------------------------------------------------
+
+
+async def _diagnose_printer_offline(ctx: WorkflowContext, state: WorkflowState) -> Dict[str, Any]:
+    t = ctx.telemetry
+    return {
+        "heartbeat_seen": bool(t.last_heartbeat_ts),
+        "online": t.online,
+        "network_reachable": t.network_reachable,
+        "spooler_healthy": t.spooler_healthy,
+        "error_codes": t.error_codes,
+    }
+
+
+async def _verify_printer_offline(ctx: WorkflowContext, state: WorkflowState) -> VerificationResult:
+    # In reality we'd re-pull telemetry from a device platform
+    t = ctx.telemetry
+    checks = {
+        "device_online": bool(t.online),
+        "heartbeat_recent": t.last_heartbeat_ts is not None,
+        "spooler_healthy": bool(t.spooler_healthy),
+    }
+    success = all(checks.values())
+    details = "All checks passed" if success else "One or more verification checks failed"
+    return VerificationResult(success=success, checks=checks, details=details)
+
+
+def _escalate_printer_offline(ctx: WorkflowContext, state: WorkflowState) -> Optional[EscalationInfo]:
+    if state.attempts >= 2:
+        return EscalationInfo(
+            required=True,
+            reason="Automated recovery attempts failed for printer_offline.",
+            target_queue="L2-Networking",
+        )
+    return None
+
+
+workflow_registry.register(
+    WorkflowDefinition(
+        workflow_type=WorkflowType.printer_offline,
+        diagnose=_diagnose_printer_offline,
+        verify=_verify_printer_offline,
+        escalate=_escalate_printer_offline,
+        summary=lambda state: "Printer offline self-heal workflow executed.",
+        # Allow one automated retry before escalation
+        max_attempts=2,
+        intent_keywords=("offline", "not responding", "cannot print"),
+    )
+)
+
+
+# ---------------------------------------------------------------------------
+# Ink / cartridge error
+# ---------------------------------------------------------------------------
+
+
+async def _diagnose_ink_error(ctx: WorkflowContext, state: WorkflowState) -> Dict[str, Any]:
+    t = ctx.telemetry
+    return {
+        "error_codes": t.error_codes,
+        "ink_levels": {
+            "cyan": t.ink_level_cyan,
+            "magenta": t.ink_level_magenta,
+            "yellow": t.ink_level_yellow,
+            "black": t.ink_level_black,
+        },
+    }
+
+
+async def _verify_ink_error(ctx: WorkflowContext, state: WorkflowState) -> VerificationResult:
+    t = ctx.telemetry
+    checks = {
+        "no_error_codes": not t.error_codes,
+        "ink_levels_non_zero": all(
+            level is None or level > 0
+            for level in [
+                t.ink_level_cyan,
+                t.ink_level_magenta,
+                t.ink_level_yellow,
+                t.ink_level_black,
+            ]
+        ),
+    }
+    success = all(checks.values())
+    details = "Ink system healthy" if success else "Ink error persists or levels invalid"
+    return VerificationResult(success=success, checks=checks, details=details)
+
+
+def _escalate_ink_error(ctx: WorkflowContext, state: WorkflowState) -> Optional[EscalationInfo]:
+    # Ink errors get a single automated attempt, so any failed verification escalates
+    return EscalationInfo(
+        required=True,
+        reason="Ink error unresolved; possible physical damage or repeated failure.",
+        target_queue="L2-Hardware",
+    )
+
+
+workflow_registry.register(
+    WorkflowDefinition(
+        workflow_type=WorkflowType.ink_error,
+        diagnose=_diagnose_ink_error,
+        verify=_verify_ink_error,
+        escalate=_escalate_ink_error,
+        summary=lambda state: "Printer ink error self-heal workflow executed.",
+        max_attempts=1,
+        intent_keywords=("ink", "cartridge"),
+    )
+)